@@ -13,16 +13,14 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from discord import Activity, ActivityType, Intents, TextChannel, Guild
-from discord.ext.commands import Bot, check, when_mentioned_or
+from discord import Activity, ActivityType, Intents, Member, MemberCacheFlags, TextChannel, Guild, Message
+from discord.ext.commands import AutoShardedBot, Bot, check
 
-from typing import Union
+from re import compile as re_compile, escape
+from typing import Optional, Pattern, Union
 
 from traceback import print_exc
 
-from expiringdict import ExpiringDict
-
-from utils.database.models.exclusions import ExcludedUser
 from utils.database.models.custom_prefixes import CustomPrefixes
 
 
@@ -30,15 +28,34 @@ class RPANBot(Bot):
     def __init__(self, core) -> None:
         self.core = core
 
+        # In low memory mode the members intent is off and no members are cached.
+        # User counts then come from the guilds' member counts, and the dashboard fetches members when it needs them.
+        low_memory = self.core.settings.discord.low_memory
+
         bot_intents = Intents.default()
-        bot_intents.members = True
+        bot_intents.members = not low_memory
+
+        member_cache_flags = MemberCacheFlags.none() if low_memory else MemberCacheFlags.from_intents(bot_intents)
+
+        shard_options = {}
+        if self.core.settings.discord.sharded:
+            shard_options["shard_count"] = self.core.settings.discord.shard_count
+            shard_options["shard_ids"] = self.core.settings.discord.shard_ids
+
+        # The shards that are connected (and haven't disconnected since).
+        self.ready_shards = set()
 
         super().__init__(
-            command_prefix=self.get_trigger_prefix,
+            **shard_options,
+
+            # Prefixes are resolved by get_prefix, so this is only the default.
+            command_prefix=self.core.settings.discord.default_prefixes,
             description="RPANBot: A bot helping link Discord and RPAN.",
 
             case_insensitive=True,
             intents=bot_intents,
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=not low_memory,
 
             activity=Activity(
                 type=ActivityType.watching,
@@ -46,8 +63,19 @@ class RPANBot(Bot):
             ),
         )
 
-        # Start a database session.
-        self.db_session = self.core.db_handler.Session()
+        # Load every guild's custom prefixes, so that resolving a message's prefix never queries.
+        self.custom_prefixes = {}
+        self.load_prefixes()
+
+        # Compiled prefix patterns by guild id (None holds the pattern for the default prefixes).
+        self.prefix_matchers = {}
+
+        self.user_count = 0
+
+        # Keep the prefixes up to date with the changes made by other processes, and share the guilds with the web role.
+        self.core.ipc.subscribe("prefixes_updated", self.set_prefixes)
+        self.core.ipc.subscribe("guilds_requested", self.publish_guilds)
+        self.core.ipc.subscribe("ipc_reconnected", self.resync)
 
         # Load the modules.
         self.module_prefix = "discord.modules.{name}"
@@ -57,11 +85,14 @@ class RPANBot(Bot):
             "events",
             "management",
             "developer",
-            "notifications_watcher",
             "help_command",
             "tasks",
         ]
 
+        # The watcher is only loaded when it runs in the same process as the bot.
+        if "watcher" in self.core.roles:
+            modules.append("notifications_watcher")
+
         for module in modules:
             try:
                 self.load_extension(self.module_prefix.format(name=module))
@@ -70,35 +101,70 @@ class RPANBot(Bot):
                 print(f"DISCORD: Failed to load {module}.")
                 print_exc()
 
-        # Initiate some of the caches.
-        self.prefix_cache = ExpiringDict(max_len=25, max_age_seconds=1800)
-        self.excluded_user_cache = ExpiringDict(max_len=25, max_age_seconds=600)
+    def load_prefixes(self) -> None:
+        """
+        Load all of the custom prefixes from the database.
+        """
+        db_session = self.core.db_handler.Session()
+        try:
+            query = db_session.query(CustomPrefixes)
+
+            # Only load the guilds of the shards that this process runs (if they're known before connecting).
+            shard_count, shard_ids = self.core.settings.discord.shard_count, self.core.settings.discord.shard_ids
+            if self.core.settings.discord.sharded and shard_count and shard_ids:
+                query = query.filter((CustomPrefixes.guild_id.op(">>")(22) % shard_count).in_(shard_ids))
+
+            self.custom_prefixes = {
+                result.guild_id: list(result.prefixes)
+                for result in query.all() if result.prefixes
+            }
+        finally:
+            db_session.close()
+
+        print(f"DISCORD: Loaded the custom prefixes of {len(self.custom_prefixes)} guilds.")
+
+    def set_prefixes(self, guild_id: int, prefixes: Union[list, None]) -> None:
+        """
+        Update the in-memory prefixes of a guild after its custom prefixes have been committed.
+        :param prefixes: The guild's custom prefixes, or None if they've been removed.
+        """
+        if prefixes:
+            self.custom_prefixes[guild_id] = list(prefixes)
+        else:
+            self.custom_prefixes.pop(guild_id, None)
+        self.prefix_matchers.pop(guild_id, None)
 
     def get_prefixes(self, guild: Guild) -> list:
         if guild is None:
             return self.core.settings.discord.default_prefixes
+        return self.custom_prefixes.get(guild.id) or self.core.settings.discord.default_prefixes
 
-        if guild.id in self.prefix_cache:
-            return self.prefix_cache[guild.id]
-        else:
-            result = self.db_session.query(CustomPrefixes).filter_by(guild_id=guild.id).first()
-            if result is None:
-                self.prefix_cache[guild.id] = self.core.settings.discord.default_prefixes
-                return self.prefix_cache[guild.id]
-            else:
-                self.prefix_cache[guild.id] = result.prefixes
-                return self.prefix_cache[guild.id]
-
-    def get_trigger_prefix(self, bot, message=None):
+    def get_prefix_matcher(self, guild_id: Optional[int]) -> Pattern:
         """
-        Get the trigger prefixes for a command (from a message).
-        :return: The prefixes that the bot should respond to for that message.
+        Get the compiled pattern that matches a guild's prefixes and the bot's two mention forms.
+        It's built on first use, and dropped by set_prefixes when the guild's prefixes change.
         """
-        if message is None:
-            return self.core.settings.discord.default_prefixes
+        if guild_id not in self.custom_prefixes:
+            guild_id = None
 
-        prefixes_to_use = self.get_prefixes(message.guild)
-        return when_mentioned_or(*prefixes_to_use)(self, message)
+        matcher = self.prefix_matchers.get(guild_id)
+        if matcher is None:
+            prefixes = self.custom_prefixes.get(guild_id) or self.core.settings.discord.default_prefixes
+
+            # Longer prefixes go first, so the longest matching prefix is the one used.
+            alternatives = [f"<@!?{self.user.id}> "] + [escape(prefix) for prefix in sorted(prefixes, key=len, reverse=True)]
+            matcher = self.prefix_matchers[guild_id] = re_compile("|".join(alternatives))
+        return matcher
+
+    async def get_prefix(self, message: Message) -> Union[str, tuple]:
+        """
+        Get the prefix that a message was sent with.
+        :return: The matched prefix, or an empty tuple (which discord.py treats as no match).
+        """
+        match = self.get_prefix_matcher(message.guild.id if message.guild else None).match(message.content)
+        if match is None:
+            return ()
+        return match.group()
 
     def get_primary_prefix(self, guild: Guild) -> str:
         prefixes = self.get_prefixes(guild)
@@ -109,30 +175,92 @@ class RPANBot(Bot):
         Checks if a user is excluded from using the bot.
         :return: If they are or not.
         """
-        if user_id in self.excluded_user_cache:
-            return self.excluded_user_cache[user_id]
+        return self.core.exclusions.is_excluded_user(user_id)
 
-        result = self.db_session.query(ExcludedUser).filter_by(user_id=user_id).first()
-        if result:
-            self.excluded_user_cache[user_id] = True
-        else:
-            self.excluded_user_cache[user_id] = False
+    def is_excluded_guild(self, guild_id: int) -> bool:
+        """
+        Checks if a guild is excluded from using the bot.
+        :return: If it is or not.
+        """
+        return self.core.exclusions.is_excluded_guild(guild_id)
+
+    def get_shard_latencies(self) -> list:
+        """
+        Get the latency of each shard that this process runs.
+        :return: A list of (shard id, latency) tuples.
+        """
+        if isinstance(self, AutoShardedBot):
+            return self.latencies
+        return [(self.shard_id or 0, self.latency)]
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        self.ready_shards.add(shard_id)
+        print(f"DISCORD: Shard {shard_id} is ready.")
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        self.ready_shards.add(shard_id)
 
-        return self.excluded_user_cache[user_id]
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        self.ready_shards.discard(shard_id)
+        print(f"DISCORD: Shard {shard_id} disconnected.")
 
     async def on_ready(self) -> None:
         print("DISCORD: Started bot.")
         await self.fetch_user_count()
+        await self.publish_guilds()
 
     async def fetch_user_count(self) -> None:
         """
         Fetches the total number of users in the guilds that RPANBot is in.
+        This sums the guilds' member counts, so it doesn't walk the member cache.
+        It's then kept up to date by the member and guild events (in the events cog).
         """
-        await self.wait_until_ready()
+        self.user_count = sum(guild.member_count or 0 for guild in self.guilds)
 
-        self.user_count = 0
-        for member in self.get_all_members():
-            self.user_count += 1
+    async def resync(self) -> None:
+        """
+        Reload the custom prefixes and republish the guilds, after any events may have been missed.
+        """
+        await self.loop.run_in_executor(None, self.load_prefixes)
+
+        # Any guild's prefixes may have changed, so the matchers are built again from the reloaded ones.
+        self.prefix_matchers = {}
+
+        if self.is_ready():
+            await self.publish_guilds()
+
+    async def publish_guilds(self) -> None:
+        """
+        Publish the ids of the guilds that the bot is in (and the user count) for the web role.
+        """
+        await self.core.ipc.publish(
+            "guilds",
+            guild_ids=[guild.id for guild in self.guilds],
+            user_count=self.user_count,
+        )
+
+    @property
+    def guild_count(self) -> int:
+        return len(self.guilds)
+
+    def has_guild(self, guild_id: int) -> bool:
+        return self.get_guild(guild_id) is not None
+
+    async def get_guild_channels(self, guild_id: int) -> list:
+        guild = self.get_guild(guild_id)
+        if guild is None:
+            return []
+        return guild.channels
+
+    async def find_member(self, guild_id: int, user_id: int) -> Union[Member, None]:
+        """
+        Find a member of a guild. If the member isn't in the cache then fetch them.
+        :return: The member found, or None if the bot isn't in the guild.
+        """
+        guild = self.get_guild(guild_id)
+        if guild is None:
+            return None
+        return guild.get_member(user_id) or await guild.fetch_member(user_id)
 
     async def find_channel(self, id: int) -> Union[TextChannel, None]:
         """
@@ -149,3 +277,18 @@ class RPANBot(Bot):
 
     def start_bot(self) -> None:
         self.run(self.core.settings.discord.token)
+
+
+class ShardedRPANBot(RPANBot, AutoShardedBot):
+    """
+    RPANBot spread over several gateway connections (shards).
+    """
+
+
+def create_bot(core) -> RPANBot:
+    """
+    Create the bot, sharded if that's enabled in the core's settings.
+    """
+    if core.settings.discord.sharded:
+        return ShardedRPANBot(core=core)
+    return RPANBot(core=core)
@@ -13,8 +13,9 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from typing import Optional, Union
+from typing import Union
 
+from utils.database.queries import count_guild_settings, get_guild_setting, get_guild_settings
 from utils.database.models.broadcast_notifications import BNSetting
 
 
@@ -45,55 +46,45 @@ class BNSettingsHandler:
         """
         return 25
 
-    def query_settings(self, guild_id: int, channel_id: Optional[int] = None):
-        """
-        Query for all notification settings on a guild or a specific channel notification setting.
-        :param guild_id: The guild to get the setting on.
-        :param channel_id: An optional paramater to get a specific channel setting.
-        :return: The result from the query.
-        """
-        if channel_id is not None:
-            return self.bot.db_session.query(BNSetting).filter_by(guild_id=guild_id, channel_id=channel_id)
-        else:
-            return self.bot.db_session.query(BNSetting).filter_by(guild_id=guild_id).order_by(BNSetting.id)
-
-    def get_setting(self, guild_id: int, channel_id: int) -> Union[None, BNSetting]:
+    async def get_setting(self, guild_id: int, channel_id: int) -> Union[None, BNSetting]:
         """
         Get a specific notification setting on a guild.
         :param guild_id: The guild to get the setting on.
         :param channel_id: The channel id (not local id) of the channel to fetch.
         :return: Either the settings or None.
         """
-        query_result = self.query_settings(guild_id, channel_id)
-        return query_result.first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            return await get_guild_setting(db_session, guild_id, channel_id)
 
-    def get_settings(self, guild_id: int) -> Union[list, None]:
+    async def get_settings(self, guild_id: int) -> Union[list, None]:
         """
         Get all notification settings on a guild.
         :param guild_id: The guild to get the settings on.
         :return: Either the settings or None.
         """
-        query_result = self.query_settings(guild_id)
-        if query_result.count() >= 1:
-            return query_result.all()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            settings = await get_guild_settings(db_session, guild_id)
+
+        if len(settings) >= 1:
+            return settings
         return None
 
-    def get_settings_count(self, guild_id: int) -> int:
+    async def get_settings_count(self, guild_id: int) -> int:
         """
         Get the current amount of notification settings on a guild.
         :return: The amount of settings, for that guild, in the database.
         """
-        query_result = self.query_settings(guild_id)
-        return query_result.count()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            return await count_guild_settings(db_session, guild_id)
 
-    def get_by_either_id(self, guild_id: int, selection_id: int) -> Union[None, BNSetting]:
+    async def get_by_either_id(self, guild_id: int, selection_id: int) -> Union[None, BNSetting]:
         """
         Get a setting by either the local ID or full channel id.
         :param guild_id: The guild to get the setting for.
         :param selection_id: Either a local id or a channel id.
         :return: None or the notification setting that was found.
         """
-        notif_settings = self.get_settings(guild_id)
+        notif_settings = await self.get_settings(guild_id)
         if notif_settings is None:
             return None
 
@@ -104,29 +95,30 @@ class BNSettingsHandler:
             return notif_settings[handling_id]
 
         # Query for a setting checking by channel id.
-        return self.get_setting(guild_id, selection_id)
+        return await self.get_setting(guild_id, selection_id)
 
-    def id_to_local(self, guild_id: int, selection_id: int) -> Union[None, int]:
+    async def id_to_local(self, guild_id: int, selection_id: int) -> Union[None, int]:
         """
         Checks a selection_id (which could be either a guild id or local id) and returns the local id.
         :param id: The id to parse.
         :return: The local id or None.
         """
-        notif_setting = self.get_by_either_id(guild_id, selection_id)
+        notif_setting = await self.get_by_either_id(guild_id, selection_id)
         if notif_setting is None:
             return None
 
-        notif_settings = self.get_settings(guild_id)
+        # The settings are loaded by separate sessions, so they're compared by id.
+        notif_settings = await self.get_settings(guild_id)
         for i, bn_setting in enumerate(notif_settings):
-            if bn_setting == notif_setting:
+            if bn_setting.id == notif_setting.id:
                 return i
         return None
 
-    def get_current_setting(self, guild_id: int) -> Union[None, BNSetting]:
+    async def get_current_setting(self, guild_id: int) -> Union[None, BNSetting]:
         """
         Gets the currently selected notification setting.
         :return: The currently selected setting or None.
         """
         current_selection = self.get_current_selection(guild_id)
-        setting = self.get_by_either_id(guild_id, current_selection)
+        setting = await self.get_by_either_id(guild_id, current_selection)
         return setting
@@ -24,6 +24,7 @@ from typing import Optional, Union
 from discord.helpers.checks import is_core_developer
 from discord.helpers.generators import RPANEmbed
 
+from utils.database.queries import get_excluded_guild, get_excluded_user
 from utils.database.models.exclusions import ExcludedGuild, ExcludedUser
 
 
@@ -76,7 +77,7 @@ class Developer(Cog):
             )
             return
 
-        self.bot.core.calculate_loc()
+        self.bot.core.start_loc_calculation()
         await ctx.send(
             "",
             embed=RPANEmbed(
@@ -153,7 +154,7 @@ class Developer(Cog):
             )
             return
 
-        self.bot.core.calculate_loc()
+        self.bot.core.start_loc_calculation()
         await ctx.send(
             "",
             embed=RPANEmbed(
@@ -246,14 +247,16 @@ class Developer(Cog):
         if guild is not None:
             await guild.leave()
 
-        result = self.bot.db_session.query(ExcludedGuild).filter_by(guild_id=id).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_excluded_guild(db_session, id)
+
         if result is None:
-            self.bot.db_session.add(
+            await self.bot.core.db_handler.save(
                 ExcludedGuild(
                     guild_id=id,
                 )
             )
-            self.bot.db_session.commit()
+            await self.bot.core.exclusions.publish("guild", id, True)
 
             await ctx.send(
                 "",
@@ -269,8 +272,8 @@ class Developer(Cog):
                 )
             )
         else:
-            self.bot.db_session.delete(result)
-            self.bot.db_session.commit()
+            await self.bot.core.db_handler.delete(result)
+            await self.bot.core.exclusions.publish("guild", id, False)
 
             await ctx.send(
                 "",
@@ -292,17 +295,16 @@ class Developer(Cog):
         """
         Ban/unban a user from using the bot.
         """
-        if id in self.bot.excluded_user_cache:
-            del self.bot.excluded_user_cache[id]
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_excluded_user(db_session, id)
 
-        result = self.bot.db_session.query(ExcludedUser).filter_by(user_id=id).first()
         if result is None:
-            self.bot.db_session.add(
+            await self.bot.core.db_handler.save(
                 ExcludedUser(
                     user_id=id,
                 )
             )
-            self.bot.db_session.commit()
+            await self.bot.core.exclusions.publish("user", id, True)
 
             await ctx.send(
                 "",
@@ -318,8 +320,8 @@ class Developer(Cog):
                 )
             )
         else:
-            self.bot.db_session.delete(result)
-            self.bot.db_session.commit()
+            await self.bot.core.db_handler.delete(result)
+            await self.bot.core.exclusions.publish("user", id, False)
 
             await ctx.send(
                 "",
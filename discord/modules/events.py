@@ -13,7 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from discord import Guild, Member, Message
+from discord import Guild, Member, Message, Role
 from discord.ext.commands import (
     Cog,
     BadArgument, BotMissingPermissions, CommandNotFound, CheckFailure, MissingRequiredArgument, MissingPermissions,
@@ -25,7 +25,7 @@ from textwrap import dedent
 from datetime import timezone
 
 from utils.helpers import erase_guild_settings
-from utils.database.models.exclusions import ExcludedGuild, ExcludedUser
+from utils.database.models.exclusions import ExcludedUser
 
 from discord.helpers.generators import RPANEmbed
 from discord.helpers.checks import is_not_excluded
@@ -51,10 +51,37 @@ class Events(Cog):
     @Cog.listener()
     async def on_member_join(self, member: Member) -> None:
         self.bot.user_count += 1
+        await self.invalidate_access(member.guild.id, member.id)
 
     @Cog.listener()
     async def on_member_remove(self, member: Member) -> None:
-        self.bot.user_count += 1
+        self.bot.user_count -= 1
+        await self.invalidate_access(member.guild.id, member.id)
+
+    # Dashboard Access
+    # The dashboard caches who can manage each guild's settings, so those entries are dropped when permissions change.
+    # (the member events need the members intent, so without it the entries only expire)
+    async def invalidate_access(self, guild_id: int, user_id: int = None) -> None:
+        await self.bot.core.ipc.publish("access_invalidated", guild_id=guild_id, user_id=user_id)
+
+    @Cog.listener()
+    async def on_member_update(self, before: Member, after: Member) -> None:
+        if before.roles != after.roles:
+            await self.invalidate_access(after.guild.id, after.id)
+
+    @Cog.listener()
+    async def on_guild_role_update(self, before: Role, after: Role) -> None:
+        if before.permissions != after.permissions:
+            await self.invalidate_access(after.guild.id)
+
+    @Cog.listener()
+    async def on_guild_role_delete(self, role: Role) -> None:
+        await self.invalidate_access(role.guild.id)
+
+    @Cog.listener()
+    async def on_guild_update(self, before: Guild, after: Guild) -> None:
+        if before.owner_id != after.owner_id:
+            await self.invalidate_access(after.id)
 
     @Cog.listener()
     async def on_message(self, message: Message) -> None:
@@ -90,9 +117,8 @@ class Events(Cog):
 
             # Check if the user has been continually spamming.
             if self.spam_counter[ctx.author.id] >= 5:
-                self.bot.db_session.add(ExcludedUser(user_id=ctx.author.id))
-                self.bot.db_session.commit()
-                del self.bot.excluded_user_cache[ctx.author.id]
+                await self.bot.core.db_handler.save(ExcludedUser(user_id=ctx.author.id))
+                await self.bot.core.exclusions.publish("user", ctx.author.id, True)
                 del self.spam_counter[ctx.author.id]
 
                 await log_channel.send(
@@ -136,8 +162,10 @@ class Events(Cog):
 
     @Cog.listener()
     async def on_guild_join(self, guild) -> None:
+        self.bot.user_count += guild.member_count or 0
+
         # Check that the guild isn't banned from the bot.
-        is_banned = self.bot.db_session.query(ExcludedGuild).filter_by(guild_id=guild.id).first()
+        is_banned = self.bot.is_excluded_guild(guild.id)
         if is_banned:
             self.exclusion_watch = guild.id
             log_channel = await self.bot.find_channel(self.bot.core.settings.ids.exclusions_and_spam_channel)
@@ -160,7 +188,7 @@ class Events(Cog):
             return
 
         # Check that the guild owner isn't banned from the bot.
-        owner_is_banned = self.bot.db_session.query(ExcludedUser).filter_by(user_id=guild.owner_id).first()
+        owner_is_banned = self.bot.is_excluded_user(guild.owner_id)
         if owner_is_banned:
             self.exclusion_watch = guild.id
             log_channel = await self.bot.find_channel(self.bot.core.settings.ids.exclusions_and_spam_channel)
@@ -182,6 +210,9 @@ class Events(Cog):
             await guild.leave()
             return
 
+        # Let the web role know about the guild, so it can be set up on the dashboard straight away.
+        await self.bot.core.ipc.publish("guild_joined", guild_id=guild.id, user_count=self.bot.user_count)
+
         # Log that the bot has joined a new guild.
         log_channel = await self.bot.find_channel(self.bot.core.settings.ids.join_leave_channel)
         await log_channel.send(
@@ -204,14 +235,19 @@ class Events(Cog):
 
     @Cog.listener()
     async def on_guild_remove(self, guild: Guild):
+        self.bot.user_count -= guild.member_count or 0
+        await self.bot.core.ipc.publish("guild_left", guild_id=guild.id, user_count=self.bot.user_count)
+
         # Ignore sending a message if the guild was left because it's banned.
         if guild.id == self.exclusion_watch:
             return
 
         # Delete any stored settings that the bot had for the guild.
-        erase_guild_settings(self.bot.db_session, guild.id)
-        if guild.id in self.bot.prefix_cache:
-            del self.bot.prefix_cache[guild.id]
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            deleted_setting_ids = await erase_guild_settings(db_session, guild.id)
+        for setting_id in deleted_setting_ids:
+            await self.bot.core.ipc.publish("setting_removed", setting_id=setting_id)
+        await self.bot.core.ipc.publish("prefixes_updated", guild_id=guild.id, prefixes=None)
 
         # Log that the bot has left a guild.
         log_channel = await self.bot.find_channel(self.bot.core.settings.ids.join_leave_channel)
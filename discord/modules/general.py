@@ -46,8 +46,9 @@ class General(Cog):
                     "Total Users": self.bot.user_count,
 
                     "Ping": f"{round(self.bot.latency * 1000)}ms",
+                    "Shards": f"{len(self.bot.ready_shards)}/{len(self.bot.get_shard_latencies())} ready" if self.bot.shard_count else "Unsharded",
                     "CPU/Memory Usage": f"{cpu_percent()}%/{virtual_memory().percent}%",
-                    "Lines of Code": self.bot.core.lines_of_code,
+                    "Lines of Code": self.bot.core.lines_of_code or "Calculating...",
                 },
 
                 url=self.bot.core.settings.links.site_base,
@@ -65,12 +66,20 @@ class General(Cog):
         """
         View the current latency of the bot.
         """
+        # List each shard's latency when the bot is sharded.
+        fields = {}
+        if self.bot.shard_count:
+            for shard_id, latency in self.bot.get_shard_latencies():
+                status = "Ready" if shard_id in self.bot.ready_shards else "Not Ready"
+                fields[f"Shard {shard_id}" + (" (this guild)" if ctx.guild and ctx.guild.shard_id == shard_id else "")] = f"{round(latency * 1000)}ms\n{status}"
+
         await ctx.send(
             "",
             embed=RPANEmbed(
                 title="Pong!",
                 description=f"{round(self.bot.latency * 1000)}ms",
                 url=self.bot.core.settings.links.site_base,
+                fields=fields,
 
                 user=ctx.author,
                 bot=self.bot,
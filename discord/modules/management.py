@@ -26,10 +26,15 @@ from discord.helpers.generators import RPANEmbed
 from discord.helpers.classes import BNSettingsHandler
 
 from utils.helpers import parse_reddit_username, to_lowercase
+from utils.subscriptions import serialize_setting
 from utils.validators import is_valid_prefix, is_valid_reddit_username
 
 from utils.database.models.custom_prefixes import CustomPrefixes
-from utils.database.models.broadcast_notifications import BNUser, BNSetting
+from utils.database.models.broadcast_notifications import BNSetting
+from utils.database.queries import (
+    add_setting_user, clear_setting_users, count_setting_users, delete_settings, get_bn_user,
+    get_custom_prefixes, get_or_create_bn_user, get_setting_usernames, has_setting_user, remove_setting_user
+)
 
 
 class Management(Cog):
@@ -50,13 +55,28 @@ class Management(Cog):
 
         self.disallowed_usernames = ["rpanbot"]
 
+    async def refresh_subscriptions(self, setting: BNSetting) -> None:
+        """
+        Update the subscription index (wherever the watcher runs) after a setting has been committed.
+        """
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            usernames = await get_setting_usernames(db_session, setting.id)
+        await self.bot.core.ipc.publish("setting_updated", setting=serialize_setting(setting), usernames=list(usernames))
+
+    async def save_setting(self, setting: BNSetting) -> None:
+        """
+        Commit the changes made to a setting and update the subscription index.
+        """
+        await self.bot.core.db_handler.save(setting)
+        await self.refresh_subscriptions(setting)
+
     # Stream Notifications
     async def validate_current_selection(self, ctx, handle_reply: bool = True) -> Union[BNSetting, bool]:
         """
         Validate that the currently selected setting is valid.
         :return: The current BNSetting or False.
         """
-        setting = self.bn_settings_handler.get_current_setting(ctx.guild.id)
+        setting = await self.bn_settings_handler.get_current_setting(ctx.guild.id)
         if setting:
             return setting
         else:
@@ -190,7 +210,7 @@ class Management(Cog):
         """
         List all of your stream notification settings.
         """
-        settings = self.bn_settings_handler.get_settings(ctx.guild.id)
+        settings = await self.bn_settings_handler.get_settings(ctx.guild.id)
         if not settings:
             await ctx.send(
                 "",
@@ -211,7 +231,7 @@ class Management(Cog):
             return
 
         fields = {}
-        current_selection = self.bn_settings_handler.id_to_local(ctx.guild.id, self.bn_settings_handler.get_current_selection(ctx.guild.id))
+        current_selection = await self.bn_settings_handler.id_to_local(ctx.guild.id, self.bn_settings_handler.get_current_selection(ctx.guild.id))
         for i, setting in enumerate(settings[:25]):
             fields[f"#{i + 1}" if i != current_selection else f"#{i + 1}\n(Currently Selected)"] = f"<#{setting.channel_id}>"
 
@@ -238,7 +258,7 @@ class Management(Cog):
         if setting is False:
             return
 
-        local_id = self.bn_settings_handler.id_to_local(ctx.guild.id, setting.channel_id)
+        local_id = await self.bn_settings_handler.id_to_local(ctx.guild.id, setting.channel_id)
         primary_prefix = self.bot.get_primary_prefix(ctx.guild)
         await ctx.send(
             "",
@@ -273,7 +293,7 @@ class Management(Cog):
             channel = channel.id
 
         # Check that there isn't a setting for this channel already.
-        setting = self.bn_settings_handler.get_setting(ctx.guild.id, channel)
+        setting = await self.bn_settings_handler.get_setting(ctx.guild.id, channel)
         if setting is not None:
             await ctx.send(
                 "",
@@ -291,7 +311,7 @@ class Management(Cog):
 
         # Check that the guild hasn't hit the channel limit.
         channel_limit = self.bn_settings_handler.get_channel_limit(ctx.guild.id)
-        if self.bn_settings_handler.query_settings(ctx.guild.id).count() >= channel_limit:
+        if await self.bn_settings_handler.get_settings_count(ctx.guild.id) >= channel_limit:
             await ctx.send(
                 "",
                 embed=RPANEmbed(
@@ -367,15 +387,16 @@ class Management(Cog):
             webhook_url=webhook.url,
         )
 
-        if username is not None:
-            user = self.bot.db_session.query(BNUser).filter_by(username=username).first()
-            if user is None:
-                user = BNUser(username=username)
-                self.bot.db_session.add(user)
-            setting.users.append(user)
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            db_session.add(setting)
+            await db_session.flush()
+
+            if username is not None:
+                user = await get_or_create_bn_user(db_session, username)
+                add_setting_user(db_session, setting.id, user.id)
 
-        self.bot.db_session.add(setting)
-        self.bot.db_session.commit()
+            await db_session.commit()
+        await self.refresh_subscriptions(setting)
 
         # Set the current guild selection to the new setting.
         self.bn_settings_handler.selections[ctx.guild.id] = channel.id
@@ -406,7 +427,7 @@ class Management(Cog):
         if isinstance(channel, TextChannel):
             channel = channel.id
 
-        setting = self.bn_settings_handler.get_by_either_id(ctx.guild.id, channel)
+        setting = await self.bn_settings_handler.get_by_either_id(ctx.guild.id, channel)
         if setting is None:
             await ctx.send(
                 "",
@@ -451,9 +472,12 @@ class Management(Cog):
             if setting is False:
                 return
 
+            async with self.bot.core.db_handler.AsyncSession() as db_session:
+                usernames = await get_setting_usernames(db_session, setting.id)
+
             usernames_text = "None"
-            if setting.users.count():
-                usernames_text = ", ".join([f"``{user.username}``" for user in setting.users])
+            if usernames:
+                usernames_text = ", ".join([f"``{username}``" for username in usernames])
 
             await ctx.send(
                 "",
@@ -510,7 +534,10 @@ class Management(Cog):
                 )
                 return
 
-        if setting.users.count() >= 50:
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            user_count = await count_setting_users(db_session, setting.id)
+
+        if user_count >= 50:
             await ctx.send(
                 "",
                 embed=RPANEmbed(
@@ -528,12 +555,9 @@ class Management(Cog):
         # Check if a BNUser record exists for that username.
         # If there isn't already a record for the user then add one.
         # If there is already a record for the user, then check that they are not already added to this BNSetting.
-        user = self.bot.db_session.query(BNUser).filter_by(username=username).first()
-        if user is None:
-            user = BNUser(username=username)
-            self.bot.db_session.add(user)
-        else:
-            if setting in user.notifications_for:
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            user = await get_or_create_bn_user(db_session, username)
+            if await has_setting_user(db_session, setting.id, user.id):
                 await ctx.send(
                     "",
                     embed=RPANEmbed(
@@ -548,8 +572,9 @@ class Management(Cog):
                 )
                 return
 
-        setting.users.append(user)
-        self.bot.db_session.commit()
+            add_setting_user(db_session, setting.id, user.id)
+            await db_session.commit()
+        await self.refresh_subscriptions(setting)
 
         await ctx.send(
             "",
@@ -587,31 +612,33 @@ class Management(Cog):
             )
             return
 
-        user = self.bot.db_session.query(BNUser).filter_by(username=username).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            user = await get_bn_user(db_session, username)
 
-        is_valid_removal = True
-        if user is None:
-            is_valid_removal = False
-        elif setting not in user.notifications_for:
-            is_valid_removal = False
+            is_valid_removal = True
+            if user is None:
+                is_valid_removal = False
+            elif not await has_setting_user(db_session, setting.id, user.id):
+                is_valid_removal = False
 
-        if not is_valid_removal:
-            await ctx.send(
-                "",
-                embed=RPANEmbed(
-                    title="Stream Notifications · Users",
-                    description=f"That user is not in the settings for <#{setting.channel_id}>",
-                    colour=0x8B0000,
+            if not is_valid_removal:
+                await ctx.send(
+                    "",
+                    embed=RPANEmbed(
+                        title="Stream Notifications · Users",
+                        description=f"That user is not in the settings for <#{setting.channel_id}>",
+                        colour=0x8B0000,
 
-                    user=ctx.author,
-                    bot=self.bot,
-                    message=ctx.message,
+                        user=ctx.author,
+                        bot=self.bot,
+                        message=ctx.message,
+                    )
                 )
-            )
-            return
+                return
 
-        setting.users.remove(user)
-        self.bot.db_session.commit()
+            await remove_setting_user(db_session, setting.id, user.id)
+            await db_session.commit()
+        await self.refresh_subscriptions(setting)
 
         await ctx.send(
             "",
@@ -634,8 +661,10 @@ class Management(Cog):
             return
 
         # Remove all users.
-        setting.users = []
-        self.bot.db_session.commit()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            await clear_setting_users(db_session, setting.id)
+            await db_session.commit()
+        await self.refresh_subscriptions(setting)
 
         await ctx.send(
             "",
@@ -744,7 +773,7 @@ class Management(Cog):
         keyword_filters.append(keyword)
 
         setting.keyword_filters = keyword_filters
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -791,7 +820,7 @@ class Management(Cog):
         keyword_filters.remove(keyword)
 
         setting.keyword_filters = keyword_filters
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -818,7 +847,7 @@ class Management(Cog):
 
         # Remove all keyword filters.
         setting.keyword_filters = []
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -912,7 +941,7 @@ class Management(Cog):
 
         setting.subreddit_filters = subreddit_filters
 
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -970,7 +999,7 @@ class Management(Cog):
         subreddit_filters = list(setting.subreddit_filters)
         subreddit_filters.remove(sub)
         setting.subreddit_filters = subreddit_filters
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -994,7 +1023,7 @@ class Management(Cog):
 
         # Remove all subreddit filters.
         setting.subreddit_filters = []
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -1038,7 +1067,7 @@ class Management(Cog):
 
         # Set the custom text.
         setting.custom_text = text
-        self.bot.db_session.commit()
+        await self.save_setting(setting)
 
         await ctx.send(
             "",
@@ -1068,7 +1097,7 @@ class Management(Cog):
             if setting is False:
                 return
         else:
-            setting = self.bn_settings_handler.get_by_either_id(ctx.guild.id, channel)
+            setting = await self.bn_settings_handler.get_by_either_id(ctx.guild.id, channel)
             if setting is None:
                 await ctx.send(
                     "",
@@ -1084,7 +1113,7 @@ class Management(Cog):
                 )
                 return
 
-        local_id = self.bn_settings_handler.id_to_local(ctx.guild.id, setting.channel_id)
+        local_id = await self.bn_settings_handler.id_to_local(ctx.guild.id, setting.channel_id)
         confirmation_message = await ctx.send(
             "",
             embed=RPANEmbed(
@@ -1130,8 +1159,10 @@ class Management(Cog):
                 pass
             finally:
                 # Delete the setting from the database.
-                self.bot.db_session.delete(setting)
-                self.bot.db_session.commit()
+                async with self.bot.core.db_handler.AsyncSession() as db_session:
+                    await delete_settings(db_session, [setting.id])
+                    await db_session.commit()
+                await self.bot.core.ipc.publish("setting_removed", setting_id=setting.id)
 
             await confirmation_message.edit(
                 embed=RPANEmbed(
@@ -1149,8 +1180,8 @@ class Management(Cog):
         """
         Delete all of your stream notification settings.
         """
-        settings = self.bn_settings_handler.query_settings(ctx.guild.id)
-        if not settings.count():
+        settings = await self.bn_settings_handler.get_settings(ctx.guild.id)
+        if not settings:
             await ctx.send(
                 "",
                 embed=RPANEmbed(
@@ -1164,8 +1195,6 @@ class Management(Cog):
                 )
             )
             return
-        else:
-            settings = settings.all()
 
         confirmation_message = await ctx.send(
             "",
@@ -1205,9 +1234,13 @@ class Management(Cog):
                     except Exception as e:
                         print(e)
                         pass
-                    finally:
-                        self.bot.db_session.delete(setting)
-            self.bot.db_session.commit()
+
+            async with self.bot.core.db_handler.AsyncSession() as db_session:
+                await delete_settings(db_session, [setting.id for setting in settings])
+                await db_session.commit()
+
+            for setting in settings:
+                await self.bot.core.ipc.publish("setting_removed", setting_id=setting.id)
 
             await confirmation_message.edit(
                 embed=RPANEmbed(
@@ -1274,18 +1307,18 @@ class Management(Cog):
             )
             return
 
-        result = self.bot.db_session.query(CustomPrefixes).filter_by(guild_id=ctx.guild.id).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_custom_prefixes(db_session, ctx.guild.id)
+
         if result is not None:
             result.prefixes = [prefix]
         else:
-            self.bot.db_session.add(
-                CustomPrefixes(
-                    guild_id=ctx.guild.id,
-                    prefixes=[prefix],
-                )
+            result = CustomPrefixes(
+                guild_id=ctx.guild.id,
+                prefixes=[prefix],
             )
-        self.bot.db_session.commit()
-        del self.bot.prefix_cache[ctx.guild.id]
+        await self.bot.core.db_handler.save(result)
+        await self.bot.core.ipc.publish("prefixes_updated", guild_id=ctx.guild.id, prefixes=list(result.prefixes))
 
         await ctx.send(
             "",
@@ -1331,7 +1364,9 @@ class Management(Cog):
             )
             return
 
-        result = self.bot.db_session.query(CustomPrefixes).filter_by(guild_id=ctx.guild.id).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_custom_prefixes(db_session, ctx.guild.id)
+
         if result is not None:
             prefixes = list(result.prefixes)
             if len(prefixes) >= 4:
@@ -1416,11 +1451,9 @@ class Management(Cog):
                 )
                 return
         else:
-            self.bot.db_session.add(
-                CustomPrefixes(
-                    guild_id=ctx.guild.id,
-                    prefixes=[prefix],
-                )
+            result = CustomPrefixes(
+                guild_id=ctx.guild.id,
+                prefixes=[prefix],
             )
 
             await ctx.send(
@@ -1442,8 +1475,8 @@ class Management(Cog):
                     message=ctx.message,
                 )
             )
-        self.bot.db_session.commit()
-        del self.bot.prefix_cache[ctx.guild.id]
+        await self.bot.core.db_handler.save(result)
+        await self.bot.core.ipc.publish("prefixes_updated", guild_id=ctx.guild.id, prefixes=list(result.prefixes))
 
     @prefix.group(name="remove", aliases=["rem", "delete"])
     async def prefix_remove(self, ctx, prefix: str) -> None:
@@ -1466,7 +1499,9 @@ class Management(Cog):
             )
             return
 
-        result = self.bot.db_session.query(CustomPrefixes).filter_by(guild_id=ctx.guild.id).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_custom_prefixes(db_session, ctx.guild.id)
+
         if result is not None:
             prefixes = list(result.prefixes)
 
@@ -1476,12 +1511,12 @@ class Management(Cog):
                 if len(prefixes) > 1:
                     prefixes.remove(prefix)
                     result.prefixes = prefixes
+                    await self.bot.core.db_handler.save(result)
+                    await self.bot.core.ipc.publish("prefixes_updated", guild_id=ctx.guild.id, prefixes=prefixes)
                 else:
                     other_info = f"\n\nAll custom prefixes have been removed. Defaulting to: {self.format_default_prefixes()}"
-                    self.bot.db_session.delete(result)
-
-                self.bot.db_session.commit()
-                del self.bot.prefix_cache[ctx.guild.id]
+                    await self.bot.core.db_handler.delete(result)
+                    await self.bot.core.ipc.publish("prefixes_updated", guild_id=ctx.guild.id, prefixes=None)
 
                 await ctx.send(
                     "",
@@ -1528,11 +1563,12 @@ class Management(Cog):
 
     @prefix.group(name="reset", aliases=["default"])
     async def prefix_reset(self, ctx) -> None:
-        result = self.bot.db_session.query(CustomPrefixes).filter_by(guild_id=ctx.guild.id).first()
+        async with self.bot.core.db_handler.AsyncSession() as db_session:
+            result = await get_custom_prefixes(db_session, ctx.guild.id)
+
         if result is not None:
-            self.bot.db_session.delete(result)
-            self.bot.db_session.commit()
-            del self.bot.prefix_cache[ctx.guild.id]
+            await self.bot.core.db_handler.delete(result)
+            await self.bot.core.ipc.publish("prefixes_updated", guild_id=ctx.guild.id, prefixes=None)
 
             await ctx.send(
                 "",
@@ -82,7 +82,7 @@ class RPAN(Cog):
         if subreddit is not None:
             subreddit = self.bot.core.rpan_subreddits.ref_to_full(subreddit)
 
-        broadcasts = self.bot.core.strapi.get_broadcasts()
+        broadcasts = await self.bot.core.strapi.get_live_broadcasts()
         if broadcasts is None:
             await ctx.send(
                 "",
@@ -99,6 +99,10 @@ class RPAN(Cog):
             return
 
         top_broadcast = broadcasts.top_broadcast(subreddit=subreddit)
+        if top_broadcast is None:
+            await ctx.send("There are no broadcasts live{} right now.".format("" if subreddit is None else f" on r/{subreddit}"))
+            return
+
         await ctx.send(
             "",
             embed=RPANEmbed(
@@ -127,7 +131,7 @@ class RPAN(Cog):
         """
         Get the statistics of a given RPAN broadcast.
         """
-        broadcast = self.bot.core.strapi.get_broadcast(stream)
+        broadcast = await self.bot.core.strapi.get_broadcast(stream)
         if broadcast is None:
             await ctx.send(
                 "",
@@ -178,7 +182,7 @@ class RPAN(Cog):
         """
         Get the current or last stream of a specified user.
         """
-        broadcasts = self.bot.core.strapi.get_broadcasts()
+        broadcasts = await self.bot.core.strapi.get_live_broadcasts()
         if broadcasts is None:
             await ctx.send(
                 "",
@@ -250,12 +254,11 @@ class RPAN(Cog):
         """
         View the top broadcasts on each RPAN subreddit.
         """
-        top_broadcasts, time = self.bot.core.strapi.get_top_broadcasts(time_period)
+        top_broadcasts, time = await self.bot.core.strapi.get_top_broadcasts(time_period)
 
         fields = {}
         for subreddit, broadcast in top_broadcasts.items():
-            if broadcast is not None:
-                fields[f"r/{subreddit}"] = f"[{broadcast.title}]({broadcast.url})"
+            fields[f"r/{subreddit}"] = f"[{broadcast.title}]({broadcast.url})"
 
         await ctx.send(
             "",
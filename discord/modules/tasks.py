@@ -21,10 +21,20 @@ class Tasks(Cog):
     def __init__(self, bot) -> None:
         self.bot = bot
 
-        self.web_task.start()
+        # The dashboard only runs on the bot's loop when they're in the same process.
+        # Otherwise the guilds are published for it now and then (so that the user count stays current).
+        if "web" in self.bot.core.roles:
+            self.web_task.start()
+        else:
+            self.guilds_task.start()
+        self.broadcasts_task.start()
+        self.top_broadcasts_task.start()
 
     def cog_unload(self) -> None:
         self.web_task.cancel()
+        self.guilds_task.cancel()
+        self.broadcasts_task.cancel()
+        self.top_broadcasts_task.cancel()
 
     @loop()
     async def web_task(self) -> None:
@@ -34,5 +44,21 @@ class Tasks(Cog):
     async def before_web_task(self) -> None:
         await self.bot.wait_until_ready()
 
+    @loop(minutes=1)
+    async def guilds_task(self) -> None:
+        await self.bot.publish_guilds()
+
+    @guilds_task.before_loop
+    async def before_guilds_task(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @loop(seconds=30)
+    async def broadcasts_task(self) -> None:
+        await self.bot.core.strapi.refresh_live_broadcasts()
+
+    @loop(minutes=5)
+    async def top_broadcasts_task(self) -> None:
+        await self.bot.core.strapi.refresh_top_broadcasts()
+
 def setup(bot) -> None:
     bot.add_cog(Tasks(bot))
@@ -0,0 +1,113 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from discord import Client, Guild, Member, TextChannel
+
+from cachetools import TTLCache
+from typing import Union
+
+
+class RemoteBot(Client):
+    def __init__(self, core) -> None:
+        """
+        A REST only client that stands in for RPANBot in processes that don't connect to the gateway (the web role).
+        The guilds that the bot is in come from the bot role over IPC, and everything else is fetched (and cached for a bit).
+        """
+        super().__init__()
+        self.core = core
+
+        self.guild_ids = set()
+        self.user_count = 0
+
+        self.guild_cache = TTLCache(maxsize=256, ttl=300)
+        self.channels_cache = TTLCache(maxsize=256, ttl=60)
+
+        self.core.ipc.subscribe("guilds", self.set_guilds)
+        self.core.ipc.subscribe("guild_joined", self.add_guild)
+        self.core.ipc.subscribe("guild_left", self.remove_guild)
+        self.core.ipc.subscribe("ipc_reconnected", self.request_guilds)
+
+    async def start_remote(self) -> None:
+        """
+        Log in (without connecting to the gateway) and ask the bot role for its guilds.
+        """
+        await self.login(self.core.settings.discord.token)
+        await self.request_guilds()
+
+    async def request_guilds(self) -> None:
+        """
+        Ask the bot role for its guilds (which it answers with the guilds event).
+        """
+        await self.core.ipc.publish("guilds_requested")
+
+    def set_guilds(self, guild_ids: list, user_count: int) -> None:
+        self.guild_ids = set(guild_ids)
+        self.user_count = user_count
+
+    def add_guild(self, guild_id: int, user_count: int) -> None:
+        self.guild_ids.add(guild_id)
+        self.user_count = user_count
+
+    def remove_guild(self, guild_id: int, user_count: int) -> None:
+        self.guild_ids.discard(guild_id)
+        self.user_count = user_count
+
+        self.guild_cache.pop(guild_id, None)
+        self.channels_cache.pop(guild_id, None)
+
+    @property
+    def guild_count(self) -> int:
+        return len(self.guild_ids)
+
+    def has_guild(self, guild_id: int) -> bool:
+        return guild_id in self.guild_ids
+
+    async def find_guild(self, guild_id: int) -> Union[Guild, None]:
+        if not self.has_guild(guild_id):
+            return None
+
+        guild = self.guild_cache.get(guild_id)
+        if guild is None:
+            guild = self.guild_cache[guild_id] = await self.fetch_guild(guild_id)
+        return guild
+
+    async def get_guild_channels(self, guild_id: int) -> list:
+        channels = self.channels_cache.get(guild_id)
+        if channels is None:
+            guild = await self.find_guild(guild_id)
+            if guild is None:
+                return []
+            channels = self.channels_cache[guild_id] = sorted(await guild.fetch_channels(), key=lambda channel: channel.position)
+        return channels
+
+    async def find_member(self, guild_id: int, user_id: int) -> Union[Member, None]:
+        """
+        Fetch a member of a guild.
+        :return: The member found, or None if the bot isn't in the guild.
+        """
+        guild = await self.find_guild(guild_id)
+        if guild is None:
+            return None
+        return await guild.fetch_member(user_id)
+
+    async def find_channel(self, id: int) -> Union[TextChannel, None]:
+        """
+        Fetch a channel by its id.
+        :return: The channel found or None.
+        """
+        try:
+            return await self.fetch_channel(id)
+        except Exception:
+            return None
@@ -13,26 +13,56 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from glob import glob
+from hypercorn.config import Config as HypercornConfig
+from hypercorn.run import run as run_hypercorn
 
-from pygount import ProjectSummary, SourceAnalysis
+from argparse import ArgumentParser
+from asyncio import get_event_loop
+from threading import Thread
 
+from utils.ipc import create_channel
 from utils.settings import Settings
+from utils.build_info import count_lines_of_code, load_build_info
 from utils.sentry import start_sentry
 from utils.reddit import RedditInstance
 from utils.strapi_wrapper import StrapiInstance
 from utils.rpan_subreddits import RPANSubreddits
+from utils.exclusions import Exclusions
+from utils.notifications import NotificationsPipeline
+from utils.subscriptions import SubscriptionIndex
 from utils.database.handler import DatabaseHandler
 
-from discord.bot import RPANBot
+from discord.bot import create_bot
 from web.quart import create_app
 
 
+# The parts of RPANBot that each role runs.
+ROLES = {
+    "all": {"bot", "web", "watcher"},
+    "bot": {"bot"},
+    "web": {"web"},
+    "watcher": {"watcher"},
+}
+
+
 class RPANBotCore:
-    def __init__(self) -> None:
+    def __init__(self, role: str = "all") -> None:
+        """
+        :param role: Which part of RPANBot this process runs (see ROLES).
+        When the roles run as separate processes, they share the database and pass cache invalidations over IPC.
+        The web role on its own isn't started here, as its app is served by Hypercorn's workers (see serve_web).
+        """
+        self.role = role
+        self.roles = ROLES[role]
+
         # Load the settings.
         self.settings = Settings()
 
+        # Create the IPC channel (the processes can't share the in-memory caches otherwise).
+        self.ipc = create_channel(self.settings)
+        if role != "all" and not self.settings.ipc.url:
+            print("IPC: No IPC url is set, so changes won't reach the other roles.")
+
         # Initiate PRAW and the custom strapi wrapper.
         self.reddit = RedditInstance(core=self)
         self.strapi = StrapiInstance(core=self)
@@ -48,19 +78,59 @@ class RPANBotCore:
         # Load the database handler.
         self.db_handler = DatabaseHandler(settings=self.settings)
 
-        # Initiate the web and bot instances.
-        self.web = create_app(core=self)
-        self.bot = RPANBot(core=self)
+        # Load the excluded users and guilds into memory (for the bot and the dashboard).
+        self.exclusions = None
+        if self.roles & {"bot", "web"}:
+            self.exclusions = Exclusions(core=self)
 
-        # Calculate the lines of code.
-        self.calculate_loc()
+        # Load the broadcast notification subscriptions into memory (only the watcher matches broadcasts).
+        self.subscriptions = None
+        if "watcher" in self.roles:
+            self.subscriptions = SubscriptionIndex(core=self)
+
+        # Initiate the web and bot instances.
+        # The web role on its own uses a REST only client in place of the bot, which is created once the app starts serving.
+        self.web = None
+        if "web" in self.roles:
+            self.web = create_app(core=self)
+
+        self.bot = None
+        if "bot" in self.roles:
+            self.bot = create_bot(core=self)
+
+        # Load the lines of code from the build info (or count them in the background if there isn't any).
+        self.lines_of_code = None
+        if "bot" in self.roles:
+            build_info = load_build_info()
+            if build_info is not None:
+                self.lines_of_code = build_info.get("lines_of_code")
+            else:
+                self.start_loc_calculation()
+
+        # Start the role.
+        if "bot" in self.roles:
+            self.bot.loop.run_until_complete(self.ipc.start())
+            self.bot.start_bot()
+        elif "watcher" in self.roles:
+            self.start_watcher()
+
+    def start_watcher(self) -> None:
+        """
+        Run the broadcast notifications watcher in its own process.
+        """
+        loop = get_event_loop()
+        loop.run_until_complete(self.ipc.start())
 
-        # Start the bot.
-        self.bot.start_bot()
+        pipeline = NotificationsPipeline(core=self, loop=loop)
+        pipeline.start()
+        try:
+            loop.run_forever()
+        finally:
+            pipeline.stop()
 
     async def handle_web(self) -> None:
         """
-        Creates the Quart task on the Discord bot event loop.
+        Runs the Quart app (on the Discord bot's event loop when they share a process).
         """
         await self.web.run_task(host="0.0.0.0", port=5050, use_reloader=False)
 
@@ -68,15 +138,49 @@ class RPANBotCore:
         """
         Calculates the number of lines of code that the bot uses.
         """
-        project_summary = ProjectSummary()
-        for source_path in glob("**/*.py", recursive=True) + glob("**/*.html", recursive=True):
-            source_analysis = SourceAnalysis.from_file(source_path, "pygount", encoding="utf-8", fallback_encoding="cp850")
-            project_summary.add(source_analysis)
+        self.lines_of_code = count_lines_of_code()
+
+    def start_loc_calculation(self) -> None:
+        """
+        Calculates the number of lines of code in a background thread.
+        """
+        Thread(target=self.calculate_loc, name="loc-calculation", daemon=True).start()
+
+
+def serve_web() -> None:
+    """
+    Serve the dashboard with Hypercorn, over several worker processes.
+    Each worker runs its own web role (see web/asgi.py), which reaches the bot over IPC.
+    """
+    settings = Settings()
+    server = settings.web.server
+
+    # The workers don't share any memory, so several of them need a shared session store and IPC.
+    # Otherwise users are logged out whenever they reach another worker, and no worker knows the bot's guilds.
+    if server["workers"] > 1:
+        if settings.web.sessions["backend"] not in ("redis", "postgres"):
+            raise SystemExit("WEB: Running several workers needs the redis or postgres session backend (web.sessions.backend).")
+        if not settings.ipc.url:
+            raise SystemExit("WEB: Running several workers needs the IPC url to be set (ipc.url).")
+
+    config = HypercornConfig()
+    config.application_path = "web.asgi:app"
+    config.bind = [server["bind"]]
+    config.workers = server["workers"]
+    config.keep_alive_timeout = server["keep_alive"]
+    config.graceful_timeout = server["graceful_timeout"]
+    config.accesslog = "-"
 
-        self.lines_of_code = 0
-        for language_summary in project_summary.language_to_language_summary_map.values():
-            self.lines_of_code += language_summary.code_count
+    run_hypercorn(config)
 
 
 if __name__ == "__main__":
-    RPANBotCore()
+    parser = ArgumentParser(description="RPANBot: A bot helping link Discord and RPAN.")
+    parser.add_argument("--role", choices=ROLES.keys(), default="all", help="which part of RPANBot to run in this process")
+    args = parser.parse_args()
+
+    # The web role on its own is served by Hypercorn, rather than the development server.
+    if args.role == "web":
+        serve_web()
+    else:
+        RPANBotCore(role=args.role)
@@ -0,0 +1,110 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from pygount import ProjectSummary, SourceAnalysis
+
+from brotli import compress as brotli_compress
+
+from gzip import compress as gzip_compress
+from json import dump, load
+from pathlib import Path
+from time import time
+
+from typing import Union
+
+
+PROJECT_PATH = Path(__file__).resolve().parent.parent
+BUILD_INFO_PATH = PROJECT_PATH / "build_info.json"
+STATIC_PATH = PROJECT_PATH / "web" / "static"
+
+# The static files that are worth precompressing (the images are compressed already).
+COMPRESSIBLE_SUFFIXES = [".css", ".js", ".svg", ".ico", ".json", ".txt"]
+
+# Vendored files that shouldn't count towards the lines of code.
+EXCLUDED_PATHS = [
+    PROJECT_PATH / "web" / "static",
+]
+
+
+def count_lines_of_code() -> int:
+    """
+    Count the lines of code in the project's Python and HTML files.
+    :return: The number of lines of code.
+    """
+    project_summary = ProjectSummary()
+    for source_path in list(PROJECT_PATH.rglob("*.py")) + list(PROJECT_PATH.rglob("*.html")):
+        if any(excluded_path in source_path.parents for excluded_path in EXCLUDED_PATHS):
+            continue
+
+        source_analysis = SourceAnalysis.from_file(str(source_path), "pygount", encoding="utf-8", fallback_encoding="cp850")
+        project_summary.add(source_analysis)
+
+    return sum(language_summary.code_count for language_summary in project_summary.language_to_language_summary_map.values())
+
+
+def compress_static_files() -> int:
+    """
+    Write the gzip and brotli variants of the static files, for the dashboard to serve.
+    A variant is only kept if it's smaller than the file.
+    :return: The number of variants written.
+    """
+    written = 0
+    for source_path in STATIC_PATH.rglob("*"):
+        if not source_path.is_file() or source_path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+
+        data = source_path.read_bytes()
+        variants = [
+            (".gz", gzip_compress(data, compresslevel=9, mtime=0)),
+            (".br", brotli_compress(data)),
+        ]
+        for suffix, compressed in variants:
+            variant_path = source_path.with_name(source_path.name + suffix)
+            if len(compressed) < len(data):
+                variant_path.write_bytes(compressed)
+                written += 1
+            elif variant_path.exists():
+                variant_path.unlink()
+
+    return written
+
+
+def generate_build_info() -> dict:
+    return {
+        "lines_of_code": count_lines_of_code(),
+        "built_at": int(time()),
+    }
+
+
+def load_build_info() -> Union[dict, None]:
+    """
+    Load the build info that was written when the image was built.
+    :return: The build info, or None if it's missing or unreadable.
+    """
+    try:
+        with open(BUILD_INFO_PATH, "r") as file:
+            return load(file)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    # Run as part of the Docker build: python -m utils.build_info
+    build_info = generate_build_info()
+    with open(BUILD_INFO_PATH, "w") as file:
+        dump(build_info, file)
+    print(f"Wrote the build info to {BUILD_INFO_PATH}: {build_info}")
+
+    print(f"Wrote {compress_static_files()} precompressed static files.")
@@ -15,30 +15,54 @@ limitations under the License.
 """
 from sqlalchemy import create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from utils.database.models.base import Base
 
 from utils.database.models.associations import BNMappedUser
 from utils.database.models.custom_prefixes import CustomPrefixes
-from utils.database.models.broadcast_notifications import BNSetting, BNUser
+from utils.database.models.dashboard_sessions import DashboardSession
+from utils.database.models.broadcast_notifications import BNCheckpoint, BNDelivery, BNSetting, BNUser
 from utils.database.models.exclusions import ExcludedGuild, ExcludedUser
 from utils.database.models.testing import BNTestingDataset
 
 
 class DatabaseHandler:
     def __init__(self, settings) -> None:
-        self.engine = create_engine(
-            "postgresql://{user}:{password}@{host}:{port}/{db}".format(
-                host=settings.database.host,
-                port=settings.database.port,
-                db=settings.database.db,
-                user=settings.database.user,
-                password=settings.database.password,
-            ),
-            echo=False
+        url = "{user}:{password}@{host}:{port}/{db}".format(
+            host=settings.database.host,
+            port=settings.database.port,
+            db=settings.database.db,
+            user=settings.database.user,
+            password=settings.database.password,
         )
 
+        # The synchronous engine is only used at startup (creating tables and loading caches).
+        self.engine = create_engine("postgresql://" + url, echo=False)
+
         self.session_factory = sessionmaker(bind=self.engine)
         self.Session = scoped_session(self.session_factory)
 
+        # The bot and the dashboard share the event loop, so anything they run goes through the async engine.
+        # Objects stay loaded after a commit, as they are often still used to reply after their session has closed.
+        self.async_engine = create_async_engine("postgresql+asyncpg://" + url, echo=False)
+        self.AsyncSession = sessionmaker(bind=self.async_engine, class_=AsyncSession, expire_on_commit=False)
+
         Base.metadata.create_all(self.engine, checkfirst=True)
+
+    async def save(self, *instances) -> None:
+        """
+        Add (or re-attach) instances and commit them in a short-lived session.
+        """
+        async with self.AsyncSession() as db_session:
+            db_session.add_all(instances)
+            await db_session.commit()
+
+    async def delete(self, *instances) -> None:
+        """
+        Delete instances in a short-lived session.
+        """
+        async with self.AsyncSession() as db_session:
+            for instance in instances:
+                await db_session.delete(instance)
+            await db_session.commit()
@@ -13,7 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from sqlalchemy import Column, BigInteger, Integer, String
+from sqlalchemy import Column, BigInteger, DateTime, Float, Integer, String, func
 from sqlalchemy.orm import relationship
 
 from utils.database.decorators import JsonDecorator
@@ -27,7 +27,8 @@ class BNUser(Base):
     id = Column(Integer, primary_key=True)
     username = Column(String(25), unique=True)
 
-    notifications_for = relationship("BNSetting", secondary="bn_mapped_users", back_populates="users", lazy="dynamic")
+    # The mappings are read and written as BNMappedUser rows (see utils.database.queries), as lazy loads can't run on the async sessions.
+    notifications_for = relationship("BNSetting", secondary="bn_mapped_users", back_populates="users", viewonly=True, lazy="raise")
 
     def __repr__(self):
         return f"BNUser({self.id}, {self.username})"
@@ -46,7 +47,40 @@ class BNSetting(Base):
     keyword_filters = Column(JsonDecorator)
     subreddit_filters = Column(JsonDecorator)
 
-    users = relationship("BNUser", secondary="bn_mapped_users", back_populates="notifications_for", lazy="dynamic")
+    users = relationship("BNUser", secondary="bn_mapped_users", back_populates="notifications_for", viewonly=True, lazy="raise")
 
     def __repr__(self):
         return f"BNSetting({self.guild_id})"
+
+
+class BNDelivery(Base):
+    """
+    A notification in the outbox.
+    It's claimed (with the broadcast's payload) before being sent, so that no two watchers send it,
+    and marked as delivered afterwards, so that a restart can resend whatever hadn't been.
+    """
+    __tablename__ = "bn_deliveries"
+
+    submission_id = Column(String(16), primary_key=True)
+    setting_id = Column(Integer, primary_key=True)
+    claimed_at = Column(DateTime, server_default=func.now(), index=True)
+
+    payload = Column(JsonDecorator)
+    delivered_at = Column(DateTime)  # Also set if the delivery was given up on.
+
+    def __repr__(self):
+        return f"BNDelivery({self.submission_id}, {self.setting_id})"
+
+
+class BNCheckpoint(Base):
+    """
+    The last submission that a watcher has processed, so that it can catch up from there after a restart.
+    """
+    __tablename__ = "bn_checkpoints"
+
+    name = Column(String(32), primary_key=True)
+    submission_id = Column(String(16))
+    created_utc = Column(Float)
+
+    def __repr__(self):
+        return f"BNCheckpoint({self.name}, {self.submission_id})"
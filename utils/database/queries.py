@@ -0,0 +1,222 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from utils.database.models.testing import BNTestingDataset
+from utils.database.models.associations import BNMappedUser
+from utils.database.models.custom_prefixes import CustomPrefixes
+from utils.database.models.exclusions import ExcludedGuild, ExcludedUser
+from utils.database.models.broadcast_notifications import BNCheckpoint, BNDelivery, BNSetting, BNUser
+
+
+async def count_rows(session, model) -> int:
+    result = await session.execute(select(func.count()).select_from(model))
+    return result.scalar()
+
+
+# Custom Prefixes
+async def get_custom_prefixes(session, guild_id: int) -> Optional[CustomPrefixes]:
+    result = await session.execute(select(CustomPrefixes).filter_by(guild_id=guild_id))
+    return result.scalars().first()
+
+
+# Exclusions
+async def get_excluded_user(session, user_id: int) -> Optional[ExcludedUser]:
+    result = await session.execute(select(ExcludedUser).filter_by(user_id=user_id))
+    return result.scalars().first()
+
+
+async def get_excluded_guild(session, guild_id: int) -> Optional[ExcludedGuild]:
+    result = await session.execute(select(ExcludedGuild).filter_by(guild_id=guild_id))
+    return result.scalars().first()
+
+
+# Testing Dataset
+async def get_dataset(session) -> list:
+    result = await session.execute(select(BNTestingDataset).order_by(BNTestingDataset.id))
+    return result.scalars().all()
+
+
+async def get_dataset_user(session, **filters) -> Optional[BNTestingDataset]:
+    result = await session.execute(select(BNTestingDataset).filter_by(**filters))
+    return result.scalars().first()
+
+
+# Broadcast Notification Settings
+async def get_guild_settings(session, guild_id: int) -> list:
+    result = await session.execute(select(BNSetting).filter_by(guild_id=guild_id).order_by(BNSetting.id))
+    return result.scalars().all()
+
+
+async def get_guild_setting(session, guild_id: int, channel_id: int) -> Optional[BNSetting]:
+    result = await session.execute(select(BNSetting).filter_by(guild_id=guild_id, channel_id=channel_id))
+    return result.scalars().first()
+
+
+async def count_guild_settings(session, guild_id: int) -> int:
+    result = await session.execute(select(func.count(BNSetting.id)).filter_by(guild_id=guild_id))
+    return result.scalar()
+
+
+async def delete_settings(session, setting_ids: Iterable[int]) -> None:
+    """
+    Delete notification settings along with their user mappings.
+    This doesn't commit.
+    """
+    setting_ids = list(setting_ids)
+    if not setting_ids:
+        return
+
+    await session.execute(delete(BNMappedUser).where(BNMappedUser.setting_id.in_(setting_ids)))
+    await session.execute(delete(BNSetting).where(BNSetting.id.in_(setting_ids)))
+
+
+# Broadcast Notification Users
+async def get_bn_user(session, username: str) -> Optional[BNUser]:
+    result = await session.execute(select(BNUser).filter_by(username=username))
+    return result.scalars().first()
+
+
+async def get_or_create_bn_user(session, username: str) -> BNUser:
+    """
+    Get the user record for a username, adding one if there isn't one yet.
+    This doesn't commit, but the user will have an id.
+    """
+    user = await get_bn_user(session, username)
+    if user is None:
+        user = BNUser(username=username)
+        session.add(user)
+        await session.flush()
+    return user
+
+
+async def get_setting_usernames(session, setting_id: int) -> list:
+    result = await session.execute(
+        select(BNUser.username)
+        .join(BNMappedUser, BNMappedUser.user_id == BNUser.id)
+        .filter(BNMappedUser.setting_id == setting_id)
+        .order_by(BNUser.username)
+    )
+    return result.scalars().all()
+
+
+async def count_setting_users(session, setting_id: int) -> int:
+    result = await session.execute(select(func.count()).select_from(BNMappedUser).filter_by(setting_id=setting_id))
+    return result.scalar()
+
+
+async def has_setting_user(session, setting_id: int, user_id: int) -> bool:
+    result = await session.execute(select(BNMappedUser).filter_by(setting_id=setting_id, user_id=user_id))
+    return result.scalars().first() is not None
+
+
+def add_setting_user(session, setting_id: int, user_id: int) -> None:
+    session.add(BNMappedUser(setting_id=setting_id, user_id=user_id))
+
+
+async def remove_setting_user(session, setting_id: int, user_id: int) -> None:
+    await session.execute(
+        delete(BNMappedUser).where(BNMappedUser.setting_id == setting_id, BNMappedUser.user_id == user_id)
+    )
+
+
+async def clear_setting_users(session, setting_id: int) -> None:
+    await session.execute(delete(BNMappedUser).where(BNMappedUser.setting_id == setting_id))
+
+
+# Broadcast Notification Deliveries
+async def claim_deliveries(session, submission_id: str, setting_ids: Iterable[int], payload: dict) -> set:
+    """
+    Claim the delivery of a submission's notifications (adding them to the outbox), skipping any that another watcher has already claimed.
+    This doesn't commit.
+    :param submission_id: The submission's fullname.
+    :param payload: The broadcast payload that the notifications are built from.
+    :return: The ids of the settings that were claimed.
+    """
+    setting_ids = list(setting_ids)
+    if not setting_ids:
+        return set()
+
+    result = await session.execute(
+        insert(BNDelivery)
+        .values([{"submission_id": submission_id, "setting_id": setting_id, "payload": payload} for setting_id in setting_ids])
+        .on_conflict_do_nothing()
+        .returning(BNDelivery.setting_id)
+    )
+    return set(result.scalars().all())
+
+
+async def mark_delivered(session, keys: Iterable[tuple]) -> None:
+    """
+    Mark notifications in the outbox as delivered.
+    This doesn't commit.
+    :param keys: (submission id, setting id) tuples.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    await session.execute(
+        update(BNDelivery)
+        .where(tuple_(BNDelivery.submission_id, BNDelivery.setting_id).in_(keys))
+        .values(delivered_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_pending_deliveries(session, max_age: timedelta) -> list:
+    """
+    Get the notifications in the outbox that haven't been delivered (ignoring any older than an age).
+    """
+    result = await session.execute(
+        select(BNDelivery)
+        .where(BNDelivery.delivered_at.is_(None), BNDelivery.claimed_at >= func.now() - max_age)
+        .order_by(BNDelivery.claimed_at)
+    )
+    return result.scalars().all()
+
+
+async def prune_deliveries(session, max_age: timedelta) -> None:
+    """
+    Delete the delivery records older than an age (by the database's clock, which they were stamped with).
+    This doesn't commit.
+    """
+    await session.execute(delete(BNDelivery).where(BNDelivery.claimed_at < func.now() - max_age))
+
+
+# Watcher Checkpoints
+async def get_checkpoint(session, name: str) -> Optional[BNCheckpoint]:
+    result = await session.execute(select(BNCheckpoint).filter_by(name=name))
+    return result.scalars().first()
+
+
+async def save_checkpoint(session, name: str, submission_id: str, created_utc: float) -> None:
+    """
+    Create or move a checkpoint (only ever forwards, so an older one can't be written over a newer one).
+    This doesn't commit.
+    """
+    statement = insert(BNCheckpoint).values(name=name, submission_id=submission_id, created_utc=created_utc)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[BNCheckpoint.name],
+            set_={"submission_id": statement.excluded.submission_id, "created_utc": statement.excluded.created_utc},
+            where=BNCheckpoint.created_utc <= statement.excluded.created_utc,
+        )
+    )
@@ -0,0 +1,85 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from asyncio import get_event_loop
+
+from utils.database.models.exclusions import ExcludedGuild, ExcludedUser
+
+
+class Exclusions:
+    def __init__(self, core) -> None:
+        """
+        Keeps the ids of the excluded users and guilds in memory.
+        It's loaded once on startup, and then kept up to date by the exclusion_updated event.
+        """
+        self.core = core
+
+        self.users = set()
+        self.guilds = set()
+
+        self.load()
+        self.core.ipc.subscribe("exclusion_updated", self.update)
+        self.core.ipc.subscribe("ipc_reconnected", self.reload)
+
+    def load(self) -> None:
+        """
+        Load all of the excluded users and guilds from the database.
+        """
+        db_session = self.core.db_handler.Session()
+        try:
+            self.users = {user_id for user_id, in db_session.query(ExcludedUser.user_id)}
+            self.guilds = {guild_id for guild_id, in db_session.query(ExcludedGuild.guild_id)}
+        finally:
+            db_session.close()
+
+        print(f"EXCLUSIONS: Loaded {len(self.users)} excluded users and {len(self.guilds)} excluded guilds.")
+
+    async def reload(self) -> None:
+        """
+        Load the exclusions again (in a thread), after any updates may have been missed.
+        """
+        await get_event_loop().run_in_executor(None, self.load)
+
+    def update(self, kind: str, id: int, excluded: bool) -> None:
+        """
+        Update an exclusion after it has been committed.
+        :param kind: Either "user" or "guild".
+        :param excluded: Whether they're now excluded.
+        """
+        ids = self.users if kind == "user" else self.guilds
+        if excluded:
+            ids.add(id)
+        else:
+            ids.discard(id)
+
+    async def publish(self, kind: str, id: int, excluded: bool) -> None:
+        """
+        Update an exclusion in every process.
+        """
+        await self.core.ipc.publish("exclusion_updated", kind=kind, id=id, excluded=excluded)
+
+    def is_excluded_user(self, user_id: int) -> bool:
+        """
+        Checks if a user is excluded from using the bot.
+        :return: If they are or not.
+        """
+        return user_id in self.users
+
+    def is_excluded_guild(self, guild_id: int) -> bool:
+        """
+        Checks if a guild is excluded from using the bot.
+        :return: If it is or not.
+        """
+        return guild_id in self.guilds
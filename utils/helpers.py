@@ -13,21 +13,24 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from utils.database.models.custom_prefixes import CustomPrefixes
-from utils.database.models.broadcast_notifications import BNSetting
+from utils.database.queries import delete_settings, get_custom_prefixes, get_guild_settings
 
 
-def erase_guild_settings(session, id: int) -> None:
-    notif_settings = session.query(BNSetting).filter_by(guild_id=id).all()
-    if notif_settings:
-        for notif_setting in notif_settings:
-            session.delete(notif_setting)
+async def erase_guild_settings(session, id: int) -> list:
+    """
+    Delete all stored settings for a guild.
+    :return: The ids of the deleted notification settings.
+    """
+    notif_settings = await get_guild_settings(session, id)
+    deleted_setting_ids = [notif_setting.id for notif_setting in notif_settings]
+    await delete_settings(session, deleted_setting_ids)
 
-    custom_prefixes = session.query(CustomPrefixes).filter_by(guild_id=id).first()
+    custom_prefixes = await get_custom_prefixes(session, id)
     if custom_prefixes:
-        session.delete(custom_prefixes)
+        await session.delete(custom_prefixes)
 
-    session.commit()
+    await session.commit()
+    return deleted_setting_ids
 
 
 def to_lowercase(text: str) -> str:
@@ -0,0 +1,166 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from asyncio import CancelledError, Task, get_event_loop, sleep
+from inspect import isawaitable
+from traceback import print_exc
+from typing import Callable, Optional
+from uuid import uuid4
+
+from aioredis import Redis, create_redis, create_redis_pool
+
+
+class IPCChannel:
+    def __init__(self) -> None:
+        """
+        Passes events (such as cache invalidations) between the bot, web and watcher roles.
+        Publishing an event runs this process' handlers straight away, and then sends it to the other processes.
+        The ipc_reconnected event is dispatched (only locally) after a lost connection comes back,
+        as any events sent in the meantime were missed, and the state they keep has to be reloaded.
+        """
+        self.handlers = {}
+
+    def subscribe(self, event: str, handler: Callable) -> None:
+        """
+        Add a handler for an event. Handlers are given the event's data as keyword arguments, and can be coroutines.
+        """
+        self.handlers.setdefault(event, []).append(handler)
+
+    async def dispatch(self, event: str, data: dict) -> None:
+        for handler in self.handlers.get(event, ()):
+            try:
+                result = handler(**data)
+                if isawaitable(result):
+                    await result
+            except Exception:
+                print(f"IPC: Failed to handle {event}.")
+                print_exc()
+
+    async def publish(self, event: str, **data) -> None:
+        """
+        Publish an event. The data has to be JSON serializable.
+        """
+        await self.dispatch(event, data)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalChannel(IPCChannel):
+    """
+    A channel for when all of the roles run in the one process (so there's no one else to send events to).
+    """
+
+
+class RedisChannel(IPCChannel):
+    def __init__(self, url: str, channel_name: str = "rpanbot") -> None:
+        """
+        A channel over Redis (or anything that speaks its pub/sub protocol).
+        :param url: The Redis URL.
+        :param channel_name: The name of the pub/sub channel that the processes share.
+        """
+        super().__init__()
+        self.url = url
+        self.channel_name = channel_name
+
+        # Used to ignore the events that this process published (as they've already been handled).
+        self.origin = uuid4().hex
+
+        self.publisher: Optional[Redis] = None
+        self.subscriber: Optional[Redis] = None
+        self.channel = None
+        self.listener: Optional[Task] = None
+
+    async def start(self) -> None:
+        # The publisher is a pool, which replaces its connections by itself if they're lost.
+        self.publisher = await create_redis_pool(self.url)
+        await self.connect_subscriber()
+        self.listener = get_event_loop().create_task(self.listen())
+
+    async def connect_subscriber(self) -> None:
+        self.subscriber = await create_redis(self.url)
+        self.channel, = await self.subscriber.subscribe(self.channel_name)
+
+    async def close_subscriber(self) -> None:
+        if self.subscriber is not None:
+            self.subscriber.close()
+            try:
+                await self.subscriber.wait_closed()
+            except Exception:
+                pass
+            self.subscriber = None
+
+    async def listen(self, max_backoff: float = 60) -> None:
+        """
+        Handle the events from the other processes, reconnecting (with a backoff) whenever the connection is lost.
+        """
+        backoff = 1
+        while True:
+            try:
+                if self.subscriber is None:
+                    await self.connect_subscriber()
+                    print("IPC: Reconnected to Redis.")
+                    backoff = 1
+                    await self.dispatch("ipc_reconnected", {})
+
+                while await self.channel.wait_message():
+                    try:
+                        message = await self.channel.get_json()
+                    except ValueError:
+                        continue
+
+                    if message.get("origin") == self.origin:
+                        continue
+                    await self.dispatch(message["event"], message["data"])
+
+                print(f"IPC: Lost the connection to Redis, reconnecting in {backoff}s.")
+            except CancelledError:
+                raise
+            except Exception as e:
+                print(f"IPC: Lost the connection to Redis ({e}), reconnecting in {backoff}s.")
+
+            await self.close_subscriber()
+            await sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+    async def publish(self, event: str, **data) -> None:
+        await self.dispatch(event, data)
+
+        try:
+            await self.publisher.publish_json(self.channel_name, {"origin": self.origin, "event": event, "data": data})
+        except Exception:
+            print(f"IPC: Failed to publish {event}.")
+            print_exc()
+
+    async def close(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+
+        await self.close_subscriber()
+        if self.publisher is not None:
+            self.publisher.close()
+            await self.publisher.wait_closed()
+
+
+def create_channel(settings) -> IPCChannel:
+    """
+    Create the IPC channel set up in the config (a local one if there's no Redis URL).
+    """
+    if settings.ipc.url:
+        return RedisChannel(url=settings.ipc.url, channel_name=settings.ipc.channel)
+    return LocalChannel()
@@ -0,0 +1,97 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from sqlalchemy import text
+
+from asyncio import CancelledError, get_event_loop, sleep
+from threading import Event
+from typing import Callable, Optional
+from zlib import crc32
+
+
+class LeaderElection:
+    def __init__(self, core, name: str, interval: float = 5, on_elected: Optional[Callable] = None) -> None:
+        """
+        Elects one leader between the processes that run with the same name, using a Postgres advisory lock.
+        The lock is held by a dedicated connection, so it's released as soon as the leader's connection is lost.
+        Followers try to take the lock every interval, which is how long a failover takes at most (once Postgres sees the old connection drop).
+        :param name: The name of what's being led (it's hashed into the lock's key).
+        :param interval: How often (in seconds) the lock is tried for, or the connection checked while leading.
+        :param on_elected: A coroutine function that's run (as a task) whenever this process becomes the leader.
+        """
+        self.core = core
+        self.name = name
+        self.key = crc32(name.encode())
+        self.interval = interval
+        self.on_elected = on_elected
+
+        # This is a threading event, so that threads can check it too.
+        self.is_leader = Event()
+
+    async def run(self) -> None:
+        """
+        Take part in the election until cancelled.
+        """
+        while True:
+            try:
+                await self.hold_election()
+            except CancelledError:
+                raise
+            except Exception as e:
+                print(f"LEADER: Lost the connection for {self.name} ({e}).")
+            finally:
+                if self.is_leader.is_set():
+                    self.is_leader.clear()
+                    print(f"LEADER: No longer leading {self.name}.")
+
+            await sleep(self.interval)
+
+    def report_elected_task(self, task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"LEADER: The election handler for {self.name} failed ({task.exception()}).")
+
+    async def hold_election(self) -> None:
+        async with self.core.db_handler.async_engine.connect() as connection:
+            # Have Postgres notice a dead leader quickly, rather than after the default two hours.
+            await connection.execute(text("SET tcp_keepalives_idle = 5"))
+            await connection.execute(text("SET tcp_keepalives_interval = 2"))
+            await connection.execute(text("SET tcp_keepalives_count = 3"))
+            await connection.commit()
+
+            try:
+                while True:
+                    if self.is_leader.is_set():
+                        # The lock is held for as long as the connection is, so just check that it's still up.
+                        await connection.execute(text("SELECT 1"))
+                    else:
+                        acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})
+                        if acquired:
+                            self.is_leader.set()
+                            print(f"LEADER: Now leading {self.name}.")
+
+                            if self.on_elected is not None:
+                                task = get_event_loop().create_task(self.on_elected())
+                                task.add_done_callback(self.report_elected_task)
+
+                    # Advisory locks are held by the session rather than the transaction, so this doesn't release it.
+                    await connection.commit()
+                    await sleep(self.interval)
+            finally:
+                # The connection is closed rather than returned to the pool, as it could still be holding the lock
+                # (which would leave every later election in this process unable to win).
+                try:
+                    await connection.invalidate()
+                except Exception:
+                    pass
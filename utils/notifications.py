@@ -0,0 +1,559 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from praw.models import Submission
+from prawcore import PrawcoreException
+
+from asyncio import AbstractEventLoop, CancelledError, Future, Queue, Semaphore, gather, run_coroutine_threadsafe, shield, sleep as async_sleep
+from expiringdict import ExpiringDict
+
+from datetime import timedelta
+from time import sleep, time
+from threading import Event, Thread
+from typing import Optional
+
+from utils.leader import LeaderElection
+from utils.submission_poller import SubmissionPoller
+from utils.strapi_models import Broadcast
+from utils.webhooks import WebhookDeliveryEngine
+from utils.subscriptions import BNSettingSnapshot
+from utils.database.queries import (
+    claim_deliveries, get_checkpoint, get_pending_deliveries, mark_delivered, prune_deliveries, save_checkpoint
+)
+
+from discord.helpers.utils import escape_username, is_rpan_broadcast, format_timestamp
+
+
+class Notification:
+    """
+    A broadcast that is being notified about.
+    It's sent using the submission's details straight away, and the Strapi details are fetched alongside.
+    The messages that were sent without them are gathered in edits, for the notification's editor task to edit.
+    """
+    __slots__ = ("broadcast", "enrichment", "edits", "editor")
+
+    def __init__(self, broadcast, enrichment: Future) -> None:
+        self.broadcast = broadcast
+        self.enrichment = enrichment
+
+        # (setting, message id) tuples, and the task that's editing them (if one is running).
+        self.edits = []
+        self.editor = None
+
+
+class NotificationsPipeline:
+    """
+    Sends broadcast notifications for new RPAN submissions.
+
+    The work is split into stages that are joined by bounded queues:
+    ingest (Reddit and Strapi polling) -> match (subscription index) -> deliver (webhooks).
+    A slow stage only fills up its own queue, and the deliver stage runs with several workers.
+    Notifications never wait on the Strapi, they're edited in place once its details arrive.
+    Each notification has its own editor task for that, so the deliver stage never waits on the edits either.
+    Both ingest sources feed the one match stage, which drops the broadcasts it has already seen (by post id),
+    so a notification goes out from whichever source sees the broadcast first.
+
+    Several watchers can run at once for redundancy. Only the elected leader ingests submissions,
+    and each notification is claimed in the database's outbox before it's sent, so no two watchers claim the same one.
+    Sent notifications are marked as delivered in batches, and whichever watcher is elected resends any that weren't.
+    This makes delivery at-least-once: a notification that was sent just before a failover (but not yet marked) is sent again.
+    The last matched submission is checkpointed, and the leader catches up from there before streaming.
+    """
+    def __init__(self, core, loop: AbstractEventLoop) -> None:
+        self.core = core
+        self.loop = loop
+        self.settings = self.core.settings.notifications
+
+        self.tasks = []
+        self.stopped = Event()
+
+        # The notifications' editor tasks.
+        self.editors = set()
+
+        self.webhooks = WebhookDeliveryEngine(
+            concurrency=self.settings.delivery_workers,
+            max_attempts=self.settings.delivery_attempts,
+        )
+
+        self.election = LeaderElection(
+            core=self.core,
+            name="notifications_watcher",
+            interval=self.settings.leader_interval,
+            on_elected=self.resume_deliveries,
+        )
+
+        # The (submission id, setting id) keys of the notifications sent since the outbox was last updated.
+        self.delivered = []
+
+        # The keys of the notifications that this watcher has claimed (or resumed) and not yet marked as delivered.
+        # They're skipped when resuming, so a re-election doesn't queue them a second time.
+        self.in_flight = set()
+
+        # The (fullname, created_utc) of the last matched submission, and of the one last saved.
+        self.checkpoint = None
+        self.saved_checkpoint = None
+
+        self.poller = SubmissionPoller(
+            reddit=self.core.reddit,
+            min_interval=self.settings.min_poll_interval,
+            max_interval=self.settings.max_poll_interval,
+        )
+
+        # The ids of the broadcasts that have been matched recently (from either ingest source).
+        self.matched = ExpiringDict(max_len=10000, max_age_seconds=self.settings.delivery_record_hours * 3600)
+
+    def start(self) -> None:
+        """
+        Start the pipeline on the event loop.
+        """
+        self.tasks.append(self.loop.create_task(self.run()))
+
+    def stop(self) -> None:
+        """
+        Stop the ingest thread and cancel the stage workers.
+        """
+        self.stopped.set()
+        for task in self.tasks:
+            task.cancel()
+        for editor in self.editors:
+            editor.cancel()
+        self.loop.create_task(self.webhooks.close())
+
+    async def run(self) -> None:
+        # The queues are created here so that they belong to the running loop.
+        self.matching_queue = Queue(maxsize=self.settings.queue_size)
+        self.delivery_queue = Queue(maxsize=self.settings.queue_size)
+
+        # The number of messages that are edited at once (over every notification).
+        self.edit_slots = Semaphore(self.settings.enrich_workers)
+
+        await self.webhooks.start()
+
+        # Matching is an in-memory lookup, so it only needs the one worker.
+        workers = [self.run_stage(self.matching_queue, self.match)]
+        workers += [self.run_stage(self.delivery_queue, self.deliver) for _ in range(self.settings.delivery_workers)]
+        workers += [self.election.run(), self.flush_delivered(), self.flush_checkpoint(), self.prune_deliveries()]
+        if self.settings.strapi_ingest:
+            workers.append(self.poll_strapi())
+
+        self.ingest_thread = Thread(target=self.watch_submissions, name="bn-ingest", daemon=True)
+        self.ingest_thread.start()
+
+        try:
+            await gather(*workers)
+        except CancelledError:
+            self.stopped.set()
+            raise
+
+    async def run_stage(self, queue: Queue, handler) -> None:
+        """
+        Continually handle the items put in a stage's queue.
+        :param queue: The queue that the stage reads from.
+        :param handler: The coroutine function that handles each item.
+        """
+        while True:
+            item = await queue.get()
+            try:
+                await handler(item)
+            except Exception as e:
+                self.report_exception(e)
+            finally:
+                queue.task_done()
+
+    def report_exception(self, e: Exception) -> None:
+        if self.core.sentry:
+            self.core.sentry.capture_exception(e)
+        print(f"NOTIFICATIONS: Error raised {e}.")
+
+    # Outbox
+    async def flush_delivered(self) -> None:
+        """
+        Mark the sent notifications as delivered every second, in one query.
+        """
+        while True:
+            await async_sleep(1)
+            if not self.delivered:
+                continue
+
+            delivered, self.delivered = self.delivered, []
+            try:
+                async with self.core.db_handler.AsyncSession() as db_session:
+                    await mark_delivered(db_session, delivered)
+                    await db_session.commit()
+                self.in_flight.difference_update(delivered)
+            except Exception as e:
+                # They're kept to be tried again, rather than being resent on the next restart.
+                self.delivered.extend(delivered)
+                self.report_exception(e)
+
+    async def resume_deliveries(self) -> None:
+        """
+        Queue the notifications in the outbox that were never delivered (such as by a watcher that stopped midway).
+        """
+        async with self.core.db_handler.AsyncSession() as db_session:
+            pending = await get_pending_deliveries(db_session, timedelta(hours=self.settings.delivery_record_hours))
+
+        # The ones that this watcher is still delivering are left to it.
+        pending = [delivery for delivery in pending if (delivery.submission_id, delivery.setting_id) not in self.in_flight]
+        if not pending:
+            return
+
+        print(f"BN: Resuming {len(pending)} undelivered notifications.")
+
+        notifications = {}
+        for delivery in pending:
+            key = (delivery.submission_id, delivery.setting_id)
+            self.in_flight.add(key)
+
+            setting = self.core.subscriptions.settings.get(delivery.setting_id)
+            if setting is None or not delivery.payload:
+                # The setting has been deleted since, or there's nothing to build the notification from.
+                self.delivered.append(key)
+                continue
+
+            notification = notifications.get(delivery.submission_id)
+            if notification is None:
+                broadcast = Broadcast(payload=delivery.payload)
+                notification = notifications[delivery.submission_id] = Notification(broadcast, self.enrich(broadcast))
+
+            await self.delivery_queue.put((setting, notification))
+
+    # Checkpoint
+    async def load_checkpoint(self) -> Optional[tuple]:
+        """
+        Get the checkpoint from the database (each time this watcher starts leading), keeping the one in memory if it's newer.
+        Another watcher may have moved it on while this one wasn't leading.
+        :return: A (fullname, created_utc) tuple or None.
+        """
+        async with self.core.db_handler.AsyncSession() as db_session:
+            checkpoint = await get_checkpoint(db_session, "notifications_watcher")
+
+        if checkpoint is not None:
+            self.saved_checkpoint = (checkpoint.submission_id, checkpoint.created_utc)
+            if self.checkpoint is None or self.saved_checkpoint[1] >= self.checkpoint[1]:
+                self.checkpoint = self.saved_checkpoint
+        return self.checkpoint
+
+    def advance_checkpoint(self, broadcast: Broadcast) -> None:
+        if self.checkpoint is None or broadcast.published_at >= self.checkpoint[1]:
+            self.checkpoint = (broadcast.id, broadcast.published_at)
+
+    async def flush_checkpoint(self) -> None:
+        """
+        Save the checkpoint every few seconds (if it's moved, and this watcher is the leader).
+        """
+        while True:
+            await async_sleep(5)
+            checkpoint = self.checkpoint
+            if checkpoint is None or checkpoint == self.saved_checkpoint or not self.election.is_leader.is_set():
+                continue
+
+            try:
+                async with self.core.db_handler.AsyncSession() as db_session:
+                    await save_checkpoint(db_session, "notifications_watcher", *checkpoint)
+                    await db_session.commit()
+                self.saved_checkpoint = checkpoint
+            except Exception as e:
+                self.report_exception(e)
+
+    async def prune_deliveries(self) -> None:
+        """
+        Delete the old delivery records every hour (only from the leader, as one is enough).
+        """
+        max_age = timedelta(hours=self.settings.delivery_record_hours)
+        while True:
+            await async_sleep(3600)
+            if not self.election.is_leader.is_set():
+                continue
+
+            try:
+                async with self.core.db_handler.AsyncSession() as db_session:
+                    await prune_deliveries(db_session, max_age)
+                    await db_session.commit()
+            except Exception as e:
+                self.report_exception(e)
+
+    # Ingest
+    def watch_submissions(self) -> None:
+        """
+        Watches for new submissions on the RPAN community subreddits. (this runs in its own thread)
+        Each broadcast is handed over to the matching stage, waiting if that queue is full.
+        The stream is only read while this watcher is the leader, and is caught up to each time it's (re)started.
+        """
+        while not self.stopped.is_set():
+            if not self.election.is_leader.wait(timeout=1):
+                continue
+
+            try:
+                skip_before, seen = self.catch_up()
+
+                # Polling starts with the latest submissions, so the ones that were caught up on (or are from before the checkpoint) are skipped.
+                submission: Submission
+                for submission in self.poller.poll(skip_before=skip_before, seen=seen):
+                    if self.stopped.is_set():
+                        return
+
+                    # Stop reading the stream if the leadership has been lost.
+                    if not self.election.is_leader.is_set():
+                        break
+
+                    if submission is None or not is_rpan_broadcast(submission.url):
+                        continue
+
+                    broadcast = self.core.strapi.submission_to_broadcast(submission)
+                    run_coroutine_threadsafe(self.matching_queue.put(broadcast), self.loop).result()
+            except PrawcoreException as e:
+                print(f"SUBMISSIONS WATCHER: {e} - PRAW error raised.")
+                sleep(15)
+            except Exception as e:
+                self.report_exception(e)
+
+    def catch_up(self) -> tuple:
+        """
+        Page back through the newest submissions to the checkpoint, queueing the missed broadcasts that are still live.
+        :return: The time to skip streamed submissions before, and the fullnames of the submissions that were looked at.
+        """
+        checkpoint = run_coroutine_threadsafe(self.load_checkpoint(), self.loop).result()
+        if checkpoint is None:
+            # There's nothing to catch up to on the first run.
+            return time(), set()
+
+        checkpoint_id, checkpoint_created = checkpoint
+        oldest = max(checkpoint_created, time() - self.settings.delivery_record_hours * 3600)
+
+        seen = set()
+        missed = []
+        for subreddit in self.core.reddit.rpan_subreddits:
+            for submission in subreddit.new(limit=None):
+                if submission.fullname == checkpoint_id or submission.created_utc < oldest:
+                    break
+
+                seen.add(submission.fullname)
+                if is_rpan_broadcast(submission.url):
+                    missed.append(submission)
+
+        if missed:
+            live_broadcasts = run_coroutine_threadsafe(self.core.strapi.refresh_live_broadcasts(), self.loop).result()
+            if live_broadcasts is not None:
+                missed = [submission for submission in missed if live_broadcasts.has_broadcast(submission.fullname)]
+            else:
+                # Without the Strapi, only the recent broadcasts are assumed to still be live.
+                cutoff = time() - self.settings.catch_up_fallback_minutes * 60
+                missed = [submission for submission in missed if submission.created_utc >= cutoff]
+
+            print(f"BN: Catching up on {len(missed)} missed broadcasts.")
+
+            # They're matched in the order that they were posted.
+            for submission in sorted(missed, key=lambda submission: submission.created_utc):
+                broadcast = self.core.strapi.submission_to_broadcast(submission)
+                run_coroutine_threadsafe(self.matching_queue.put(broadcast), self.loop).result()
+
+        return checkpoint_created, seen
+
+    async def poll_strapi(self) -> None:
+        """
+        Poll the Strapi's live broadcasts (while leading), queueing the broadcasts that weren't in the previous snapshot.
+        This usually sees a broadcast before its submission reaches the PRAW stream.
+        """
+        previous_ids = None
+        while True:
+            await async_sleep(self.settings.strapi_poll_interval)
+            if not self.election.is_leader.is_set():
+                previous_ids = None
+                continue
+
+            broadcasts = await self.core.strapi.refresh_live_broadcasts()
+            if broadcasts is None:
+                continue
+
+            # The first snapshot is only a baseline, as the broadcasts that were already live are caught up on from Reddit.
+            if previous_ids is not None:
+                for broadcast in broadcasts.broadcasts:
+                    if broadcast.is_live and broadcast.id not in previous_ids:
+                        await self.matching_queue.put(broadcast)
+            previous_ids = set(broadcasts.ids)
+
+    # Match
+    async def match(self, broadcast: Broadcast) -> None:
+        # A broadcast already matched from the other source still moves the checkpoint on.
+        if broadcast.id not in self.matched:
+            self.matched[broadcast.id] = True
+            try:
+                await self.match_broadcast(broadcast)
+            except Exception:
+                # It's forgotten (and the checkpoint isn't moved past it), so that it can be matched again.
+                self.matched.pop(broadcast.id, None)
+                raise
+
+        # Only the submissions from Reddit are checkpointed, as that's what's caught up on.
+        if broadcast.source != "strapi":
+            self.advance_checkpoint(broadcast)
+
+    async def match_broadcast(self, broadcast: Broadcast) -> None:
+        notifications_for = self.core.subscriptions.lookup(broadcast.author_name.lower())
+        if not notifications_for:
+            return
+
+        # The broadcast has everything that the filters check, so the Strapi isn't waited on.
+        notifications_for = [setting for setting in notifications_for if setting.accepts(broadcast)]
+        if not notifications_for:
+            return
+
+        # Claim the notifications, dropping any that another watcher has already sent.
+        async with self.core.db_handler.AsyncSession() as db_session:
+            claimed = await claim_deliveries(db_session, broadcast.id, [setting.id for setting in notifications_for], broadcast.payload)
+            await db_session.commit()
+
+        notifications_for = [setting for setting in notifications_for if setting.id in claimed]
+        if not notifications_for:
+            return
+        self.in_flight.update((broadcast.id, setting.id) for setting in notifications_for)
+
+        notification = Notification(broadcast, self.enrich(broadcast))
+
+        for setting in notifications_for:
+            await self.delivery_queue.put((setting, notification))
+
+    def enrich(self, broadcast: Broadcast) -> Future:
+        """
+        Start fetching the Strapi's details of a broadcast (unless they're what it came from).
+        :return: A future of the detailed broadcast (or None).
+        """
+        if broadcast.source == "strapi":
+            enrichment = self.loop.create_future()
+            enrichment.set_result(broadcast)
+            return enrichment
+
+        return self.loop.create_task(
+            self.core.strapi.get_broadcast(broadcast.id[3:], deadline=self.settings.enrich_deadline)
+        )
+
+    # Deliver
+    async def deliver(self, item: tuple) -> None:
+        setting, notification = item
+        try:
+            await self.send_notification(setting, notification)
+        except Exception:
+            # It wasn't sent, so it's left for a later resume.
+            self.in_flight.discard((notification.broadcast.id, setting.id))
+            raise
+
+    async def send_notification(self, setting: BNSettingSnapshot, notification: Notification) -> None:
+        # If the Strapi has already answered, then the message can be sent complete.
+        enrichment = notification.enrichment
+        if enrichment.done() and not enrichment.cancelled() and enrichment.exception() is None and enrichment.result():
+            sent = await self.webhooks.send(setting.webhook_url, self.build_notification_payload(setting, enrichment.result()))
+
+            # Failed sends are marked too, as the webhook engine has already retried whatever could be.
+            self.delivered.append((notification.broadcast.id, setting.id))
+            if sent:
+                print("BN: Succesfully messaged a stream notification.")
+            return
+
+        message = await self.webhooks.send(
+            setting.webhook_url,
+            self.build_notification_payload(setting, notification.broadcast),
+            wait=True,
+        )
+        self.delivered.append((notification.broadcast.id, setting.id))
+        if message:
+            print("BN: Succesfully messaged a stream notification.")
+            self.queue_edit(setting, notification, message["id"])
+
+    # Edit
+    def queue_edit(self, setting: BNSettingSnapshot, notification: Notification, message_id: str) -> None:
+        """
+        Add a sent message to its notification's edits, starting the notification's editor if it isn't running.
+        """
+        notification.edits.append((setting, message_id))
+        if notification.editor is None:
+            notification.editor = self.loop.create_task(self.edit(notification))
+            self.editors.add(notification.editor)
+            notification.editor.add_done_callback(self.editors.discard)
+
+    async def edit(self, notification: Notification) -> None:
+        """
+        Wait for a notification's Strapi details, and then edit every message that was sent without them.
+        """
+        try:
+            broadcast = await shield(notification.enrichment)
+        except Exception as e:
+            self.report_exception(e)
+            broadcast = None
+
+        try:
+            # Messages can still be added while the others are being edited, so this runs until there are none left.
+            while broadcast is not None and notification.edits:
+                edits, notification.edits = notification.edits, []
+                await gather(*[self.edit_message(setting, broadcast, message_id) for setting, message_id in edits])
+        finally:
+            notification.edits = []
+            notification.editor = None
+
+    async def edit_message(self, setting: BNSettingSnapshot, broadcast, message_id: str) -> None:
+        payload = self.build_notification_payload(setting, broadcast)
+        async with self.edit_slots:
+            try:
+                await self.webhooks.edit(
+                    setting.webhook_url,
+                    message_id,
+                    {"content": payload["content"], "embeds": payload["embeds"]},
+                )
+            except Exception as e:
+                self.report_exception(e)
+
+    def build_notification_payload(self, setting: BNSettingSnapshot, broadcast) -> dict:
+        """
+        Builds the webhook message for a broadcast notification.
+        :return: The webhook payload.
+        """
+        escaped_username = escape_username(broadcast.author_name)
+
+        embed = {
+            "title": f"u/{escaped_username} started streaming!",
+            "url": broadcast.url,
+            "color": 26763,
+            "fields": [
+                {
+                    "name": "Title",
+                    "value": broadcast.title,
+                    "inline": True,
+                },
+                {
+                    "name": "Subreddit",
+                    "value": f"r/{broadcast.subreddit_name}",
+                    "inline": True,
+                }
+            ],
+            "footer": {},
+            "thumbnail": {"url": broadcast.thumbnail}
+        }
+
+        if isinstance(broadcast.global_rank, int):
+            embed["fields"].append({
+                "name": "Rank",
+                "value": f"{broadcast.global_rank}/{broadcast.total_streams}",
+                "inline": True,
+            })
+
+        if broadcast.published_at:
+            embed["footer"]["text"] = f"Started: {format_timestamp(broadcast.published_at)}"
+
+        return {
+            "username": "RPANBot",
+            "avatar_url": self.core.settings.links.bot_avatar,
+            "content": ("" if not setting.custom_text else setting.custom_text),
+            "embeds": [embed],
+        }
@@ -17,9 +17,16 @@ import praw
 
 
 class RPANBotReddit(praw.Reddit):
+    # The longest that a multireddit's name can get before it's split up (to stay well within URL limits).
+    max_multireddit_length = 1000
+
     def __init__(self, core) -> None:
         self.core = core
 
+        # The multireddits are only rebuilt when the subreddit list changes.
+        self.rpan_subreddit_names = None
+        self.rpan_subreddit_chunks = []
+
         self.user_agent = "RPANBot v2.2 (by u/OneUpPotato, u/JayRy27 and u/bsoyka - GitHub: RPANBot/RPANBot)"
         super().__init__(
             **self.core.settings.reddit.auth_info,
@@ -28,8 +35,26 @@ class RPANBotReddit(praw.Reddit):
         print(f"Authenticated with Reddit as u/{self.user.me()}")
 
     @property
-    def rpan_subreddits(self) -> praw.models.Subreddit:
-        return self.subreddit("+".join(self.core.rpan_subreddits.list))
+    def rpan_subreddits(self) -> list:
+        """
+        Get the RPAN community subreddits as multireddits.
+        There's usually just the one, but a long list of subreddits is split across several.
+        :return: A list of subreddit instances.
+        """
+        names = tuple(self.core.rpan_subreddits.list)
+        if names != self.rpan_subreddit_names:
+            chunks, chunk = [], []
+            for name in names:
+                if chunk and len("+".join(chunk + [name])) > self.max_multireddit_length:
+                    chunks.append(chunk)
+                    chunk = []
+                chunk.append(name)
+            if chunk:
+                chunks.append(chunk)
+
+            self.rpan_subreddit_chunks = [self.subreddit("+".join(chunk)) for chunk in chunks]
+            self.rpan_subreddit_names = names
+        return self.rpan_subreddit_chunks
 
     def is_valid_user(self, redditor: praw.models.Redditor) -> bool:
         try:
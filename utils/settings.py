@@ -16,6 +16,7 @@ limitations under the License.
 from os import getenv
 
 from pathlib import Path
+from typing import Union
 from yaml import safe_load
 from dotenv import load_dotenv
 
@@ -41,6 +42,9 @@ class RPANBotSettings:
         self.discord = self.Discord(self)
 
         self.database = self.Database(self)
+        self.notifications = self.Notifications(self)
+
+        self.ipc = self.IPC(self)
 
         print("Succesfully loaded the settings.")
 
@@ -76,6 +80,26 @@ class RPANBotSettings:
         def redirect_uri(self) -> str:
             return self.parent.config["web"]["callbacks"]["login"]
 
+        @property
+        def server(self) -> dict:
+            server = self.parent.config["web"].get("server") or {}
+            return {
+                "bind": server.get("bind", "0.0.0.0:5050"),
+                "workers": server.get("workers", 1),
+                "keep_alive": server.get("keep_alive", 5),
+                "graceful_timeout": server.get("graceful_timeout", 10),
+            }
+
+        @property
+        def sessions(self) -> dict:
+            sessions = self.parent.config["web"].get("sessions") or {}
+            return {
+                "backend": sessions.get("backend", "memory"),
+                "url": sessions.get("url"),
+                "max_age": sessions.get("max_age", 86400),
+                "cache_size": sessions.get("cache_size", 10000),
+            }
+
     class Database:
         def __init__(self, parent) -> None:
             self.parent = parent
@@ -100,6 +124,78 @@ class RPANBotSettings:
         def password(self) -> str:
             return self.parent.config["database"]["password"]
 
+    class IPC:
+        def __init__(self, parent) -> None:
+            self.parent = parent
+
+        @property
+        def config(self) -> dict:
+            return self.parent.config.get("ipc") or {}
+
+        @property
+        def url(self) -> Union[str, None]:
+            return self.config.get("url")
+
+        @property
+        def channel(self) -> str:
+            return self.config.get("channel", "rpanbot")
+
+    class Notifications:
+        def __init__(self, parent) -> None:
+            self.parent = parent
+
+        @property
+        def config(self) -> dict:
+            return self.parent.config.get("notifications") or {}
+
+        @property
+        def queue_size(self) -> int:
+            return self.config.get("queue_size", 100)
+
+        @property
+        def enrich_workers(self) -> int:
+            return self.config.get("enrich_workers", 4)
+
+        @property
+        def delivery_workers(self) -> int:
+            return self.config.get("delivery_workers", 25)
+
+        @property
+        def delivery_attempts(self) -> int:
+            return self.config.get("delivery_attempts", 5)
+
+        @property
+        def enrich_deadline(self) -> int:
+            return self.config.get("enrich_deadline", 30)
+
+        @property
+        def leader_interval(self) -> int:
+            return self.config.get("leader_interval", 5)
+
+        @property
+        def delivery_record_hours(self) -> int:
+            return self.config.get("delivery_record_hours", 24)
+
+        @property
+        def min_poll_interval(self) -> float:
+            return self.config.get("min_poll_interval", 2)
+
+        @property
+        def max_poll_interval(self) -> float:
+            return self.config.get("max_poll_interval", 10)
+
+        @property
+        def strapi_ingest(self) -> bool:
+            return self.config.get("strapi_ingest", True)
+
+        @property
+        def strapi_poll_interval(self) -> int:
+            return self.config.get("strapi_poll_interval", 10)
+
+        @property
+        def catch_up_fallback_minutes(self) -> int:
+            return self.config.get("catch_up_fallback_minutes", 60)
+
     class Reddit:
         def __init__(self, parent) -> None:
             self.parent = parent
@@ -187,6 +283,26 @@ class RPANBotSettings:
         def default_prefixes(self) -> list:
             return self.parent.config["default_prefixes"]
 
+        @property
+        def low_memory(self) -> bool:
+            return self.parent.config.get("low_memory", False)
+
+        @property
+        def sharding(self) -> dict:
+            return self.parent.config.get("sharding") or {}
+
+        @property
+        def sharded(self) -> bool:
+            return self.sharding.get("enabled", False)
+
+        @property
+        def shard_count(self) -> Union[int, None]:
+            return self.sharding.get("shard_count")
+
+        @property
+        def shard_ids(self) -> Union[list, None]:
+            return self.sharding.get("shard_ids") or None
+
         @property
         def client_id(self) -> id:
             return getenv("DISCORD_CLIENT_ID")
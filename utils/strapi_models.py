@@ -18,6 +18,10 @@ from typing import Union
 
 class Broadcast:
     def __init__(self, payload: dict) -> None:
+        # The payload is kept so that the broadcast can be stored (such as in the notifications outbox).
+        self.payload = payload
+        self.source = payload.get("source", None)
+
         self.id = payload["post"]["id"]
 
         self.title = payload["post"]["title"]
@@ -69,6 +73,16 @@ class Broadcasts:
         if contents:
             self.broadcasts = contents
 
+        # Index the broadcasts by id, lowercase streamer and lowercase subreddit.
+        # The list is ordered by rank, so the first broadcast seen on a subreddit is its top broadcast.
+        self.ids = {}
+        self.streamers = {}
+        self.subreddit_tops = {}
+        for broadcast in self.broadcasts:
+            self.ids.setdefault(broadcast.id, broadcast)
+            self.streamers.setdefault(broadcast.author_name.lower(), broadcast)
+            self.subreddit_tops.setdefault(broadcast.subreddit_name.lower(), broadcast)
+
     def top_broadcast(self, subreddit: str = None) -> Union[Broadcast, None]:
         """
         Get the top broadcast.
@@ -80,12 +94,7 @@ class Broadcasts:
 
         if subreddit is None:
             return self.broadcasts[0]
-        else:
-            subreddit = subreddit.lower()
-            for broadcast in self.broadcasts:
-                if broadcast.subreddit_name.lower() == subreddit:
-                    return broadcast
-        return None
+        return self.subreddit_tops.get(subreddit.lower())
 
     def has_broadcast(self, id: str) -> Union[Broadcast, bool]:
         """
@@ -93,10 +102,7 @@ class Broadcasts:
         :param id: The id of the broadcast.
         :return: The broadcast or False.
         """
-        for broadcast in self.broadcasts:
-            if broadcast.id == id:
-                return broadcast
-        return False
+        return self.ids.get(id, False)
 
     def has_streamer(self, name: str) -> Union[Broadcast, bool]:
         """
@@ -104,11 +110,7 @@ class Broadcasts:
         :param name: The streamer to search for.
         :return: The broadcast or False.
         """
-        name = name.lower()
-        for broadcast in self.broadcasts:
-            if broadcast.author_name.lower() == name:
-                return broadcast
-        return False
+        return self.streamers.get(name.lower(), False)
 
     def __repr__(self) -> str:
         return f"Broadcasts({', '.join(repr(broadcast) for broadcast in self.broadcasts)})"
@@ -15,7 +15,13 @@ limitations under the License.
 """
 from praw.models import Submission
 
-from time import sleep
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from asyncio import Lock, TimeoutError, gather, get_event_loop, sleep, wait_for
+from concurrent.futures import ThreadPoolExecutor
+from random import uniform
+from time import monotonic
+
 from typing import Union
 from requests import get, Response
 from datetime import datetime, timezone
@@ -33,9 +39,19 @@ class StrapiWrapper:
         self.praw = self.core.reddit
         self.settings = self.core.settings
 
-        self.top_broadcasts_cache = ExpiringDict(max_len=3, max_age_seconds=300)
+        # The top broadcasts for each time period, which are kept warm by the tasks cog.
+        self.top_broadcasts_periods = ("hour", "day", "week", "month", "year", "all")
+        self.top_broadcasts_cache = ExpiringDict(max_len=len(self.top_broadcasts_periods), max_age_seconds=600)
+        self.top_broadcasts_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="top-broadcasts")
 
         self.base_url = "https://strapi.reddit.com/"
+        self.session = None
+
+        # A shared snapshot of the live broadcasts, refreshed in the background by the tasks cog.
+        self.live_broadcasts = None
+        self.live_broadcasts_checked_at = 0.0
+        self.live_broadcasts_interval = 30
+        self.live_broadcasts_lock = None
 
     def get_headers(self) -> dict:
         return {
@@ -53,6 +69,47 @@ class StrapiWrapper:
             headers=self.get_headers(),
         )
 
+    async def handle_async_request(self, endpoint: str) -> Union[dict, None]:
+        """
+        Send a request to the Strapi without blocking the event loop.
+        :return: The decoded response or None.
+        """
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(timeout=ClientTimeout(total=10))
+
+        async with self.session.get(url=self.base_url + endpoint, headers=self.get_headers()) as response:
+            return await response.json(content_type=None)
+
+    async def retry_until(self, fetch, *args, deadline: float) -> Union[object, None]:
+        """
+        Keep calling a fetch method, with a jittered backoff between attempts, until it gives a result or the deadline passes.
+        :param fetch: The coroutine function to call.
+        :param deadline: The amount of seconds to keep trying for.
+        :return: The result or None.
+        """
+        end = monotonic() + deadline
+
+        attempt = 0
+        while True:
+            remaining = end - monotonic()
+            if remaining <= 0:
+                return None
+
+            try:
+                result = await wait_for(fetch(*args), timeout=remaining)
+            except (ClientError, TimeoutError, ValueError):
+                result = None
+
+            if result is not None:
+                return result
+
+            delay = min(uniform(0.5, 1.5) * (2 ** attempt), end - monotonic())
+            if delay <= 0:
+                return None
+
+            await sleep(delay)
+            attempt += 1
+
     def fetch_viewer_subreddits(self) -> list:
         """
         Fetch a list of the recommended viewer subreddits.
@@ -63,62 +120,84 @@ class StrapiWrapper:
             return request.json()["data"]
         return []
 
-    def fetch_broadcast(self, id: str) -> Union[Broadcast, None]:
+    async def fetch_broadcast(self, id: str) -> Union[Broadcast, None]:
         """
         Fetch a broadcast by id.
         :return: The broadcast class or None.
         """
-        request = self.handle_request("broadcasts/" + id)
-        if request.json()["status"] == "success":
-            payload = request.json()["data"]
+        response = await self.handle_async_request("broadcasts/" + id)
+        if response["status"] == "success":
+            payload = response["data"]
             payload["source"] = "strapi"
 
             return Broadcast(payload=payload)
         return None
 
-    def fetch_broadcasts(self) -> Union[Broadcasts, None]:
+    async def fetch_broadcasts(self) -> Union[Broadcasts, None]:
         """
         Fetch all of the current broadcasts.
         :return: The broadcasts fetched or None.
         """
-        request = self.handle_request("broadcasts")
-        if request.json()["status"] == "success":
+        response = await self.handle_async_request("broadcasts")
+        if response["status"] == "success":
             broadcasts = []
-            if len(request.json()["data"]):
-                for broadcast in request.json()["data"]:
-                    payload = broadcast
-                    payload["source"] = "strapi"
-                    broadcasts.append(Broadcast(payload=payload))
+            for broadcast in response["data"]:
+                payload = broadcast
+                payload["source"] = "strapi"
+                broadcasts.append(Broadcast(payload=payload))
 
-                return Broadcasts(contents=broadcasts)
+            return Broadcasts(contents=broadcasts)
         return None
 
-    def get_broadcast(self, id: str) -> Union[Broadcast, None]:
+    async def get_broadcast(self, id: str, deadline: float = 10) -> Union[Broadcast, None]:
         """
-        Attempt to fetch and retrieve a broadcast.
+        Attempt to fetch and retrieve a broadcast, retrying until the deadline.
+        :param deadline: The amount of seconds to keep trying for.
         :return: The retrieved broadcast or None.
         """
-        broadcast = self.fetch_broadcast(id)
-        if broadcast is not None:
-            return broadcast
-
-        # Attempt to fetch the broadcast again.
-        sleep(10)
-        return self.fetch_broadcast(id)
+        return await self.retry_until(self.fetch_broadcast, id, deadline=deadline)
 
-    def get_broadcasts(self) -> Union[Broadcasts, None]:
+    async def get_broadcasts(self, deadline: float = 10) -> Union[Broadcasts, None]:
         """
-        Attempt to fetch and retrieve the active broadcasts.
-        :note: Maybe memoize this for 30 seconds or so.
+        Attempt to fetch and retrieve the active broadcasts, retrying until the deadline.
+        :note: Commands should use get_live_broadcasts, which shares one fetch between them.
+        :param deadline: The amount of seconds to keep trying for.
         :return: The retrieved broadcasts or None.
         """
-        broadcasts = self.fetch_broadcasts()
+        return await self.retry_until(self.fetch_broadcasts, deadline=deadline)
+
+    async def refresh_live_broadcasts(self) -> Union[Broadcasts, None]:
+        """
+        Fetch the active broadcasts into the shared snapshot.
+        The previous snapshot is kept if the Strapi can't be reached.
+        :return: The fetched broadcasts or None.
+        """
+        broadcasts = await self.get_broadcasts()
         if broadcasts is not None:
-            return broadcasts
+            self.live_broadcasts = broadcasts
+
+        # Failed fetches count too, so that while the Strapi is down the callers share one failure per interval
+        # (rather than each waiting through another full fetch).
+        self.live_broadcasts_checked_at = monotonic()
+        return broadcasts
+
+    async def get_live_broadcasts(self) -> Union[Broadcasts, None]:
+        """
+        Get the shared snapshot of the active broadcasts.
+        It's only fetched here if it's gone stale (or the last fetch failed a while ago), with concurrent callers waiting on the one fetch.
+        :return: The snapshot or None.
+        """
+        if monotonic() - self.live_broadcasts_checked_at < self.live_broadcasts_interval:
+            return self.live_broadcasts
 
-        # Attempt to fetch the broadcasts again.
-        sleep(10)
-        return self.fetch_broadcasts()
+        if self.live_broadcasts_lock is None:
+            self.live_broadcasts_lock = Lock()
+
+        async with self.live_broadcasts_lock:
+            # Another caller may have refreshed it whilst this one was waiting.
+            if monotonic() - self.live_broadcasts_checked_at >= self.live_broadcasts_interval:
+                await self.refresh_live_broadcasts()
+        return self.live_broadcasts
 
     def get_last_broadcast(self, username: str) -> Union[Broadcast, None]:
         """
@@ -134,43 +213,79 @@ class StrapiWrapper:
                 return self.submission_to_broadcast(submission)
         return None
 
-    def get_top_broadcasts(self, time_period: str = None) -> tuple:
+    def parse_time_period(self, time_period: str = None) -> str:
         """
-        Get the top broadcast on each subreddit (from within a specific time period)
-        :return: A tuple of the top broadcasts in each subreddit and the time period used.
+        Get the search time period to use, defaulting to a week.
+        :return: The time period.
         """
-        allowed_time_periods = [
-            "hour",
-            "day",
-            "week",
-            "month",
-            "year",
-            "all",
-        ]
-
         if time_period:
             time_period = time_period.lower()
 
-        if time_period not in allowed_time_periods:
+        if time_period not in self.top_broadcasts_periods:
             time_period = "week"
+        return time_period
 
-        if time_period in self.top_broadcasts_cache:
-            return self.top_broadcasts_cache[time_period], time_period
-        else:
-            top_broadcasts = {}
-            for subreddit in self.core.rpan_subreddits.list:
-                for submission in self.praw.subreddit(subreddit).search("flair_name:\"Broadcast\"", sort="top", time_filter=time_period, limit=1):
-                    top_broadcasts[subreddit] = submission
+    def search_top_broadcast(self, subreddit: str, time_period: str) -> Union[Submission, None]:
+        """
+        Search for the top broadcast on a subreddit. (this blocks, so it's run on the top broadcasts pool)
+        :return: The top broadcast submission or None.
+        """
+        for submission in self.praw.subreddit(subreddit).search("flair_name:\"Broadcast\"", sort="top", time_filter=time_period, limit=1):
+            return submission
+        return None
 
-            self.top_broadcasts_cache[time_period] = top_broadcasts
-            return top_broadcasts, time_period
+    async def fetch_top_broadcasts(self, time_period: str) -> dict:
+        """
+        Search for the top broadcast on each subreddit, with the searches running concurrently.
+        :return: The top broadcasts on each subreddit.
+        """
+        loop = get_event_loop()
+        subreddits = list(self.core.rpan_subreddits.list)
+
+        results = await gather(*[
+            loop.run_in_executor(self.top_broadcasts_pool, self.search_top_broadcast, subreddit, time_period)
+            for subreddit in subreddits
+        ])
+
+        top_broadcasts = {subreddit: submission for subreddit, submission in zip(subreddits, results) if submission is not None}
+        self.top_broadcasts_cache[time_period] = top_broadcasts
+        return top_broadcasts
+
+    async def refresh_top_broadcasts(self) -> None:
+        """
+        Fetch the top broadcasts for every time period, so that the command can answer from the cache.
+        """
+        for time_period in self.top_broadcasts_periods:
+            try:
+                await self.fetch_top_broadcasts(time_period)
+            except Exception as e:
+                print(f"STRAPI: Problem fetching the top broadcasts ({time_period}) - {e}")
+
+    async def get_top_broadcasts(self, time_period: str = None) -> tuple:
+        """
+        Get the top broadcast on each subreddit (from within a specific time period)
+        :return: A tuple of the top broadcasts in each subreddit and the time period used.
+        """
+        time_period = self.parse_time_period(time_period)
+
+        top_broadcasts = self.top_broadcasts_cache.get(time_period)
+        if top_broadcasts is None:
+            top_broadcasts = await self.fetch_top_broadcasts(time_period)
+        return top_broadcasts, time_period
 
     def submission_to_broadcast(self, submission: Submission) -> Union[Broadcast, None]:
         """
         Turn a PRAW submission into a broadcast class.
         :return: The broadcast class.
         """
-        return Broadcast(payload={
+        return Broadcast(payload=self.submission_to_payload(submission))
+
+    def submission_to_payload(self, submission: Submission) -> dict:
+        """
+        Turn a PRAW submission into a broadcast payload (that can be stored, and turned into a broadcast class later).
+        :return: The broadcast payload.
+        """
+        return {
             "post": {
                 "id": submission.fullname,
                 "title": submission.title,
@@ -186,7 +301,7 @@ class StrapiWrapper:
                 "state": "IS_LIVE",  # TODO: Switch stream state
                 "publish_at": submission.created_utc,
             }
-        })
+        }
 
     def format_broadcast_timestamp(self, timestamp: int) -> str:
         """
@@ -0,0 +1,119 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from praw.models import Submission
+
+from expiringdict import ExpiringDict
+
+from time import monotonic, sleep, time
+from typing import Generator, Iterable, Union
+
+
+class DetectionLatency:
+    def __init__(self) -> None:
+        """
+        Tracks how long after being posted new submissions are seen.
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency: float) -> None:
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class SubmissionPoller:
+    def __init__(self, reddit, min_interval: float = 2, max_interval: float = 10, report_interval: float = 300) -> None:
+        """
+        Polls the newest submissions of the RPAN community subreddits (in place of PRAW's stream).
+        It polls every min_interval while submissions keep coming, backing off to no more than max_interval when it's quiet.
+        :param report_interval: How often (in seconds) the detection latency is reported.
+        """
+        self.reddit = reddit
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.report_interval = report_interval
+
+        self.interval = min_interval
+        self.latency = DetectionLatency()
+        self.reported_at = monotonic()
+
+        # The fullnames of the submissions that have already been yielded.
+        self.seen = ExpiringDict(max_len=5000, max_age_seconds=86400)
+
+    def poll(self, skip_before: float = None, seen: Iterable[str] = ()) -> Generator[Union[Submission, None], None, None]:
+        """
+        Continually poll for new submissions.
+        None is yielded after every poll (so that the caller has a chance to stop).
+        :param skip_before: Skip the submissions created before this time.
+        :param seen: The fullnames of submissions to skip.
+        :return: The new submissions (oldest first).
+        """
+        for fullname in seen:
+            self.seen[fullname] = True
+
+        while True:
+            polled_at = monotonic()
+
+            new_submissions = []
+            for subreddit in self.reddit.rpan_subreddits:
+                for submission in subreddit.new(limit=100):
+                    if submission.fullname in self.seen:
+                        continue
+                    if skip_before is not None and submission.created_utc < skip_before:
+                        continue
+
+                    self.seen[submission.fullname] = True
+                    new_submissions.append(submission)
+
+            if new_submissions:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * 2, self.max_interval)
+
+            # The chunks are each in order, so they're merged into the order that the submissions were posted.
+            now = time()
+            for submission in sorted(new_submissions, key=lambda submission: submission.created_utc):
+                self.latency.add(now - submission.created_utc)
+                yield submission
+
+            self.report()
+            yield None
+
+            sleep(max(0.0, self.interval - (monotonic() - polled_at)))
+
+    def report(self) -> None:
+        """
+        Print the detection latency every report interval, so that the poll intervals can be tuned.
+        """
+        if monotonic() - self.reported_at < self.report_interval:
+            return
+
+        if self.latency.count:
+            print(
+                f"BN: Saw {self.latency.count} new submissions, {self.latency.average:.1f}s after posting on average "
+                f"({self.latency.max:.1f}s at most). Polling every {self.interval:.0f}s."
+            )
+        self.latency.reset()
+        self.reported_at = monotonic()
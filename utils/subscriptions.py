@@ -0,0 +1,201 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from asyncio import get_event_loop
+from types import SimpleNamespace
+from typing import Iterable
+
+from utils.database.models.testing import BNTestingDataset
+from utils.database.models.associations import BNMappedUser
+from utils.database.models.broadcast_notifications import BNSetting, BNUser
+
+
+class BNSettingSnapshot:
+    """
+    A read-only copy of a broadcast notification setting, with its filters prepared for matching.
+    """
+    __slots__ = ("id", "guild_id", "channel_id", "webhook_url", "custom_text", "keyword_filters", "subreddit_filters")
+
+    def __init__(self, setting: BNSetting) -> None:
+        self.id = setting.id
+
+        self.guild_id = setting.guild_id
+        self.channel_id = setting.channel_id
+        self.webhook_url = setting.webhook_url
+
+        self.custom_text = setting.custom_text
+        self.keyword_filters = tuple(keyword.lower() for keyword in (setting.keyword_filters or []))
+        self.subreddit_filters = frozenset(subreddit.lower() for subreddit in (setting.subreddit_filters or []))
+
+    def accepts(self, broadcast) -> bool:
+        """
+        Checks a broadcast against the keyword and subreddit filters of this setting.
+        :return: Whether a notification should be sent.
+        """
+        # Ensure that the broadcast has the required keyword filters (if the setting has that).
+        if self.keyword_filters:
+            title = broadcast.title.lower()
+            if not any(keyword in title for keyword in self.keyword_filters):
+                return False
+
+        # Check that the broadcast is in an accepted subreddit (if there are subreddit_filters).
+        if self.subreddit_filters:
+            if broadcast.subreddit_name.lower() not in self.subreddit_filters:
+                return False
+
+        return True
+
+    def __repr__(self) -> str:
+        return f"BNSettingSnapshot({self.id}, {self.guild_id})"
+
+
+def serialize_setting(setting: BNSetting) -> dict:
+    """
+    Get the fields that a setting's snapshot is built from (so that it can be sent to the watcher).
+    """
+    return {field: getattr(setting, field) for field in BNSettingSnapshot.__slots__}
+
+
+class SubscriptionIndex:
+    def __init__(self, core) -> None:
+        """
+        Keeps every broadcast notification subscription in memory, so matching a broadcast needs no queries.
+        It's loaded once on startup, and then kept up to date by the events published by whatever changes the settings.
+        """
+        self.core = core
+
+        # Setting id -> snapshot, and setting id -> the usernames it has notifications for.
+        self.settings = {}
+        self.setting_users = {}
+
+        # Lowercase username -> tuple of the snapshots that want notifications for them.
+        self.subscriptions = {}
+
+        # Lowercase usernames in the testing dataset.
+        self.dataset = frozenset()
+
+        self.load()
+
+        self.core.ipc.subscribe("setting_updated", self.handle_setting_updated)
+        self.core.ipc.subscribe("setting_removed", self.remove_setting)
+        self.core.ipc.subscribe("dataset_updated", self.handle_dataset_updated)
+        self.core.ipc.subscribe("ipc_reconnected", self.reload)
+
+    def load(self) -> None:
+        """
+        Load all of the subscriptions from the database.
+        """
+        db_session = self.core.db_handler.Session()
+        try:
+            settings = {setting.id: BNSettingSnapshot(setting) for setting in db_session.query(BNSetting).all()}
+
+            setting_users = {}
+            mappings = db_session.query(BNMappedUser.setting_id, BNUser.username).join(BNUser, BNUser.id == BNMappedUser.user_id)
+            for setting_id, username in mappings:
+                setting_users.setdefault(setting_id, set()).add(username.lower())
+
+            dataset = frozenset(username.lower() for username, in db_session.query(BNTestingDataset.username))
+        finally:
+            db_session.close()
+
+        self.settings = settings
+        self.setting_users = {setting_id: frozenset(usernames) for setting_id, usernames in setting_users.items()}
+        self.dataset = dataset
+
+        subscriptions = {}
+        for setting_id, usernames in self.setting_users.items():
+            snapshot = self.settings.get(setting_id)
+            if snapshot is None:
+                continue
+
+            for username in usernames:
+                subscriptions.setdefault(username, []).append(snapshot)
+        self.subscriptions = {username: tuple(snapshots) for username, snapshots in subscriptions.items()}
+
+        print(f"BN: Loaded {len(self.settings)} notification settings for {len(self.subscriptions)} users.")
+
+    async def reload(self) -> None:
+        """
+        Load the subscriptions again (in a thread), after any updates may have been missed.
+        """
+        await get_event_loop().run_in_executor(None, self.load)
+
+    def lookup(self, author: str) -> tuple:
+        """
+        Get the settings that a broadcast from a user should be sent to.
+        :param author: The lowercase username of the broadcaster.
+        :return: A tuple of setting snapshots.
+        """
+        notifications_for = self.subscriptions.get(author, ())
+
+        # If the user is in the testing dataset then send a notification to all channels with 'rpanbot' added.
+        if author in self.dataset:
+            dataset_settings = self.subscriptions.get("rpanbot", ())
+            if dataset_settings:
+                notifications_for = tuple({setting.id: setting for setting in notifications_for + dataset_settings}.values())
+
+        return notifications_for
+
+    def replace_snapshot(self, setting_id: int, snapshot, previous_usernames: frozenset, usernames: frozenset) -> None:
+        """
+        Swap a setting's snapshot in the entries of the users it had and has notifications for.
+        """
+        for username in previous_usernames | usernames:
+            snapshots = tuple(existing for existing in self.subscriptions.get(username, ()) if existing.id != setting_id)
+            if username in usernames:
+                snapshots += (snapshot,)
+
+            if snapshots:
+                self.subscriptions[username] = snapshots
+            else:
+                self.subscriptions.pop(username, None)
+
+    def update_setting(self, setting: BNSetting, usernames: Iterable[str]) -> None:
+        """
+        Update the index after a setting has been created or changed.
+        :param setting: The committed setting.
+        :param usernames: The usernames that the setting has notifications for.
+        """
+        usernames = frozenset(username.lower() for username in usernames)
+        previous_usernames = self.setting_users.get(setting.id, frozenset())
+
+        snapshot = BNSettingSnapshot(setting)
+        self.settings[setting.id] = snapshot
+        self.setting_users[setting.id] = usernames
+
+        self.replace_snapshot(setting.id, snapshot, previous_usernames, usernames)
+
+    def handle_setting_updated(self, setting: dict, usernames: list) -> None:
+        self.update_setting(SimpleNamespace(**setting), usernames)
+
+    def handle_dataset_updated(self, username: str, added: bool) -> None:
+        if added:
+            self.add_dataset_user(username)
+        else:
+            self.remove_dataset_user(username)
+
+    def remove_setting(self, setting_id: int) -> None:
+        """
+        Remove a deleted setting from the index.
+        """
+        self.settings.pop(setting_id, None)
+        previous_usernames = self.setting_users.pop(setting_id, frozenset())
+        self.replace_snapshot(setting_id, None, previous_usernames, frozenset())
+
+    def add_dataset_user(self, username: str) -> None:
+        self.dataset = self.dataset | {username.lower()}
+
+    def remove_dataset_user(self, username: str) -> None:
+        self.dataset = self.dataset - {username.lower()}
@@ -0,0 +1,175 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout, TCPConnector
+
+from asyncio import Lock, Semaphore, TimeoutError, sleep
+from random import uniform
+from time import monotonic
+from typing import Optional, Union
+
+
+class WebhookBucket:
+    def __init__(self) -> None:
+        """
+        A token bucket for a single webhook.
+        The size and refill time come from the X-RateLimit headers of Discord's responses.
+        """
+        self.remaining = None
+        self.reset_at = 0.0
+        self.lock = Lock()
+
+    async def acquire(self) -> None:
+        """
+        Take a token, waiting for the bucket to reset if it's empty.
+        """
+        async with self.lock:
+            if self.remaining is not None and self.remaining <= 0:
+                delay = self.reset_at - monotonic()
+                if delay > 0:
+                    await sleep(delay)
+                self.remaining = None
+
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def update(self, response: ClientResponse) -> None:
+        """
+        Update the bucket from the headers of a response.
+        """
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_after = response.headers.get("X-RateLimit-Reset-After")
+
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = monotonic() + float(reset_after)
+
+
+class WebhookDeliveryEngine:
+    def __init__(self, concurrency: int = 25, max_attempts: int = 5) -> None:
+        """
+        Executes webhooks over a shared keep-alive session.
+        Requests are limited by a concurrency cap, and by a token bucket per webhook.
+        Rate limited (429) and server error (5xx) responses are retried with a backoff.
+        :param concurrency: The maximum amount of requests in flight.
+        :param max_attempts: The amount of times a request is attempted before giving up.
+        """
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+        self.session = None
+        self.semaphore = None
+
+        self.buckets = {}
+        self.global_reset_at = 0.0
+
+    async def start(self) -> None:
+        """
+        Create the session. This has to be done from within the event loop.
+        """
+        self.semaphore = Semaphore(self.concurrency)
+        self.session = ClientSession(
+            connector=TCPConnector(limit=self.concurrency, keepalive_timeout=60, ttl_dns_cache=300),
+            timeout=ClientTimeout(total=15),
+            headers={"User-Agent": "DiscordBot (https://github.com/RPANBot/RPANBot, 2.2)"},
+        )
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_bucket(self, webhook_url: str) -> WebhookBucket:
+        bucket = self.buckets.get(webhook_url)
+        if bucket is None:
+            bucket = self.buckets[webhook_url] = WebhookBucket()
+        return bucket
+
+    def get_backoff(self, attempt: int) -> float:
+        return min(2 ** attempt, 30) + uniform(0, 1)
+
+    async def request(self, method: str, url: str, bucket: WebhookBucket, payload: dict) -> Optional[ClientResponse]:
+        """
+        Send a request to a webhook, retrying it if it is rate limited or fails on Discord's side.
+        :return: The successful response (with its body read), or None.
+        """
+        for attempt in range(self.max_attempts):
+            # Wait out a global rate limit.
+            global_delay = self.global_reset_at - monotonic()
+            if global_delay > 0:
+                await sleep(global_delay)
+
+            await bucket.acquire()
+
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, url, json=payload) as response:
+                        await response.read()
+            except (ClientError, TimeoutError) as e:
+                print(f"BN: Webhook request failed ({e}), retrying.")
+                await sleep(self.get_backoff(attempt))
+                continue
+
+            bucket.update(response)
+
+            if response.status < 300:
+                return response
+
+            if response.status == 429:
+                retry_after = response.headers.get("X-RateLimit-Reset-After") or response.headers.get("Retry-After")
+                retry_after = float(retry_after) if retry_after else self.get_backoff(attempt)
+
+                if response.headers.get("X-RateLimit-Global"):
+                    self.global_reset_at = monotonic() + retry_after
+
+                print(f"BN: Webhook rate limited, retrying in {retry_after:.2f}s.")
+                await sleep(retry_after)
+                continue
+
+            if response.status >= 500:
+                await sleep(self.get_backoff(attempt))
+                continue
+
+            # Other errors (such as a deleted webhook) won't be fixed by retrying.
+            print(f"BN: Problem messaging using webhook. (HTTP {response.status})")
+            return None
+
+        print("BN: Gave up on a webhook after too many attempts.")
+        return None
+
+    async def send(self, webhook_url: str, payload: dict, wait: bool = False) -> Union[dict, bool, None]:
+        """
+        Execute a webhook.
+        :param wait: Whether Discord should reply with the created message.
+        :return: The message payload if waiting, otherwise whether the message was sent.
+        """
+        url = webhook_url + "?wait=true" if wait else webhook_url
+        response = await self.request("POST", url, self.get_bucket(webhook_url), payload)
+
+        if not wait:
+            return response is not None
+        if response is None:
+            return None
+        return await response.json()
+
+    async def edit(self, webhook_url: str, message_id: str, payload: dict) -> bool:
+        """
+        Edit a message that was sent by a webhook.
+        :return: Whether the message was edited.
+        """
+        url = f"{webhook_url}/messages/{message_id}"
+        response = await self.request("PATCH", url, self.get_bucket(webhook_url), payload)
+        return response is not None
@@ -0,0 +1,21 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from main import RPANBotCore
+
+
+# The ASGI app for Hypercorn's workers. (e.g. hypercorn --workers 4 --bind 0.0.0.0:5050 web.asgi:app)
+# Each worker runs its own web role, which gets the bot's state over IPC.
+app = RPANBotCore(role="web").web
@@ -13,7 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from quart import Blueprint, current_app, flash, render_template, redirect, request, url_for
+from quart import Blueprint, current_app, flash, g, render_template, redirect, request, url_for
 
 from discord import AsyncWebhookAdapter, Webhook
 
@@ -22,14 +22,28 @@ from aiohttp import ClientSession
 from web.helpers.user_handler import authed_only
 
 from utils.helpers import parse_reddit_username
+from utils.subscriptions import serialize_setting
 from utils.validators import is_valid_prefix, is_valid_reddit_username
 
 from utils.database.models.custom_prefixes import CustomPrefixes
-from utils.database.models.broadcast_notifications import BNUser, BNSetting
+from utils.database.models.broadcast_notifications import BNSetting
+from utils.database.queries import (
+    add_setting_user, count_setting_users, delete_settings, get_bn_user, get_custom_prefixes,
+    get_guild_setting, get_guild_settings, get_or_create_bn_user, get_setting_usernames, has_setting_user, remove_setting_user
+)
 
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard", template_folder="templates")
 
+
+async def refresh_subscriptions(setting: BNSetting) -> None:
+    """
+    Update the subscription index (wherever the watcher runs) after a setting has been committed.
+    """
+    usernames = await get_setting_usernames(g.db_session, setting.id)
+    await current_app.core.ipc.publish("setting_updated", setting=serialize_setting(setting), usernames=list(usernames))
+
+
 @dashboard_bp.route("/")
 async def main():
     return await render_template("dashboard/main.html")
@@ -41,7 +55,8 @@ async def refresh():
     # Refeshes a user's guilds.
     # TODO: Add a cooldown instead of only allowing them to refresh once per login.
     user = current_app.user_handler.get_user()
-    user.refresh()
+    await user.refresh()
+    await current_app.user_handler.save_user(user)
     return redirect(url_for("dashboard.main"))
 
 
@@ -63,10 +78,10 @@ async def guild_general(id: int):
     if id in user.guilds_mapping.keys():
         guild = user.guilds_mapping[id]
 
-        if not guild.user_has_access():
+        if not await guild.user_has_access():
             return "No Permissions"
 
-        custom_prefixes = current_app.db_session.query(CustomPrefixes).filter_by(guild_id=guild.id).first()
+        custom_prefixes = await get_custom_prefixes(g.db_session, guild.id)
         if custom_prefixes is not None:
             custom_prefixes = custom_prefixes.prefixes
 
@@ -82,7 +97,7 @@ async def guild_general_prefix(id: int):
     if id in user.guilds_mapping.keys():
         guild = user.guilds_mapping[id]
 
-        if not guild.user_has_access():
+        if not await guild.user_has_access():
             return "No Permissions"
 
         # Fetch the form info.
@@ -94,7 +109,7 @@ async def guild_general_prefix(id: int):
         if remove_prefix:
             prefix = remove_prefix
 
-            result = current_app.db_session.query(CustomPrefixes).filter_by(guild_id=id).first()
+            result = await get_custom_prefixes(g.db_session, id)
             if result is not None:
                 prefixes = list(result.prefixes)
 
@@ -103,12 +118,11 @@ async def guild_general_prefix(id: int):
                         prefixes.remove(prefix)
                         result.prefixes = prefixes
                     else:
-                        current_app.db_session.delete(result)
+                        prefixes = None
+                        await g.db_session.delete(result)
 
-                    current_app.db_session.commit()
-
-                    if id in current_app.core.bot.prefix_cache:
-                        del current_app.core.bot.prefix_cache[id]
+                    await g.db_session.commit()
+                    await current_app.core.ipc.publish("prefixes_updated", guild_id=id, prefixes=prefixes)
 
                     await flash(u"Deleted that prefix. 🙂👍", "success")
                 else:
@@ -131,7 +145,7 @@ async def guild_general_prefix(id: int):
                 await flash(u"That is not a valid prefix.", "danger")
                 return redirect(url_for("dashboard.guild_general", id=id))
 
-            result = current_app.db_session.query(CustomPrefixes).filter_by(guild_id=id).first()
+            result = await get_custom_prefixes(g.db_session, id)
             if result is not None:
                 prefixes = list(result.prefixes)
                 if len(prefixes) == 4:
@@ -150,20 +164,16 @@ async def guild_general_prefix(id: int):
                     prefixes.append(prefix)
                     result.prefixes = prefixes
 
-                    current_app.db_session.commit()
-
-                    if id in current_app.core.bot.prefix_cache:
-                        del current_app.core.bot.prefix_cache[id]
+                    await g.db_session.commit()
+                    await current_app.core.ipc.publish("prefixes_updated", guild_id=id, prefixes=prefixes)
 
                     await flash(u"Added prefix. 🙂👍", "success")
                 else:
                     await flash(u"That prefix is already added.", "danger")
             else:
-                current_app.db_session.add(CustomPrefixes(guild_id=id, prefixes=[prefix]))
-                current_app.db_session.commit()
-
-                if id in current_app.core.bot.prefix_cache:
-                    del current_app.core.bot.prefix_cache[id]
+                g.db_session.add(CustomPrefixes(guild_id=id, prefixes=[prefix]))
+                await g.db_session.commit()
+                await current_app.core.ipc.publish("prefixes_updated", guild_id=id, prefixes=[prefix])
 
                 await flash(u"Succesfully set a custom prefix.", "success")
 
@@ -181,24 +191,27 @@ async def guild_notifications(id: int):
     if id in user.guilds_mapping.keys():
         guild = user.guilds_mapping[id]
 
-        if not guild.user_has_access():
+        if not await guild.user_has_access():
             return "No Permissions"
 
         setting_channel = None
+        selected_setting_usernames = []
         selected_setting = request.args.get("setting", None)
         if selected_setting:
-            selected_setting = current_app.db_session.query(BNSetting).filter_by(guild_id=id, channel_id=int(selected_setting)).first()
+            selected_setting = await get_guild_setting(g.db_session, id, int(selected_setting))
             if selected_setting is None:
                 await flash(u"Stream Notifications > That is an invalid notification setting.", "danger")
             else:
                 setting_channel = await current_app.core.bot.find_channel(selected_setting.channel_id)
+                selected_setting_usernames = await get_setting_usernames(g.db_session, selected_setting.id)
 
-        channels = current_app.core.bot.get_guild(guild.id).channels
+        channels = await current_app.core.bot.get_guild_channels(guild.id)
+        channels_by_id = {channel.id: channel for channel in channels}
 
         notif_channels = {}
-        for i, setting in enumerate(current_app.db_session.query(BNSetting).filter_by(guild_id=id).order_by(BNSetting.id).all()):
-            listing_channel = current_app.core.bot.get_channel(setting.channel_id)
-            if setting_channel:
+        for i, setting in enumerate(await get_guild_settings(g.db_session, id)):
+            listing_channel = channels_by_id.get(setting.channel_id)
+            if listing_channel:
                 notif_channels[f"#{listing_channel.name} (#{i + 1})"] = setting
             else:
                 notif_channels[f"Unknown (#{i + 1})"] = setting
@@ -212,6 +225,7 @@ async def guild_notifications(id: int):
 
             selected_setting=selected_setting,
             selected_setting_channel=setting_channel,
+            selected_setting_usernames=selected_setting_usernames,
 
             subreddit_filters=current_app.core.rpan_subreddits.list,
         )
@@ -226,7 +240,7 @@ async def guild_notifications_submit(id: int):
     if id in user.guilds_mapping.keys():
         guild = user.guilds_mapping[id]
 
-        if not guild.user_has_access():
+        if not await guild.user_has_access():
             return "No Permissions"
 
         # Fetch the form info.
@@ -255,7 +269,7 @@ async def guild_notifications_submit(id: int):
                 return redirect(url_for("dashboard.guild_notifications", id=id))
 
             # Check that a setting does not exist already for that channel.
-            setting = current_app.db_session.query(BNSetting).filter_by(guild_id=id, channel_id=channel_id).first()
+            setting = await get_guild_setting(g.db_session, id, channel_id)
             if setting is not None:
                 await flash(u"Stream Notifications > That channel already has a setting. Select it in the other dropdown menu.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id))
@@ -271,8 +285,9 @@ async def guild_notifications_submit(id: int):
                 channel_id=channel.id,
                 webhook_url=webhook.url,
             )
-            current_app.db_session.add(setting)
-            current_app.db_session.commit()
+            g.db_session.add(setting)
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={channel_id}")
 
@@ -285,7 +300,7 @@ async def guild_notifications_submit(id: int):
                 await flash(u"Stream Notifications > That is not a valid notifications channel.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id))
 
-            setting = current_app.db_session.query(BNSetting).filter_by(guild_id=id, channel_id=selected_channel).first()
+            setting = await get_guild_setting(g.db_session, id, selected_channel)
             if setting is None:
                 await flash(u"Stream Notifications > That is not a valid notifications channel.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id))
@@ -304,7 +319,7 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
     if id in user.guilds_mapping.keys():
         guild = user.guilds_mapping[id]
 
-        if not guild.user_has_access():
+        if not await guild.user_has_access():
             return "No Permissions"
 
         # Fetch the form info.
@@ -312,7 +327,7 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
         form = await request.form
 
         # Get the setting.
-        setting = current_app.db_session.query(BNSetting).filter_by(guild_id=id, channel_id=setting_id).first()
+        setting = await get_guild_setting(g.db_session, id, setting_id)
         if setting is None:
             await flash(u"Stream Notifications > That is not a valid notifications channel.", "danger")
             return redirect(url_for("dashboard.guild_notifications", id=id))
@@ -334,7 +349,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                 subreddit_filters = list(setting.subreddit_filters)
             subreddit_filters.append(subreddit)
             setting.subreddit_filters = subreddit_filters
-            current_app.db_session.commit()
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Stream Notifications > Added a subreddit filter.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -360,7 +376,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                 keyword_filters = list(setting.keyword_filters)
             keyword_filters.append(keyword)
             setting.keyword_filters = keyword_filters
-            current_app.db_session.commit()
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Stream Notifications > Added a keyword filter.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -383,21 +400,18 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                     await flash(u"Usernames > That is a disallowed username for stream notifications.", "danger")
                     return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
-            if setting.users.count() >= 50:
+            if await count_setting_users(g.db_session, setting.id) >= 50:
                 await flash(u"Usernames > This channel is currently at the limit of 50 users.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
-            user = current_app.db_session.query(BNUser).filter_by(username=username).first()
-            if user is None:
-                user = BNUser(username=username)
-                current_app.db_session.add(user)
-            else:
-                if setting in user.notifications_for:
-                    await flash(u"Usernames > That user is already added to the settings for this channel.", "danger")
-                    return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
+            bn_user = await get_or_create_bn_user(g.db_session, username)
+            if await has_setting_user(g.db_session, setting.id, bn_user.id):
+                await flash(u"Usernames > That user is already added to the settings for this channel.", "danger")
+                return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
-            setting.users.append(user)
-            current_app.db_session.commit()
+            add_setting_user(g.db_session, setting.id, bn_user.id)
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Usernames > Added a user to the notifications.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -416,7 +430,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
             subreddit_filters = list(setting.subreddit_filters)
             subreddit_filters.remove(subreddit)
             setting.subreddit_filters = subreddit_filters
-            current_app.db_session.commit()
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Subreddit Filters > Removed a subreddit filter.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -441,7 +456,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
             keyword_filters = list(setting.keyword_filters)
             del keyword_filters[keyword_index]
             setting.keyword_filters = keyword_filters
-            current_app.db_session.commit()
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Keyword Filters > Removed a keyword filter.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -457,20 +473,21 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                 await flash(u"Users > That is not a valid Reddit username.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
-            user = current_app.db_session.query(BNUser).filter_by(username=username).first()
+            bn_user = await get_bn_user(g.db_session, username)
 
             is_valid_removal = True
-            if user is None:
+            if bn_user is None:
                 is_valid_removal = False
-            elif setting not in user.notifications_for:
+            elif not await has_setting_user(g.db_session, setting.id, bn_user.id):
                 is_valid_removal = False
 
             if not is_valid_removal:
                 await flash(u"Users > That user is not in the settings for this channel.", "danger")
                 return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
-            setting.users.remove(user)
-            current_app.db_session.commit()
+            await remove_setting_user(g.db_session, setting.id, bn_user.id)
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(f"Users > You will no longer receive notifications for u/{username} in this channel.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -480,7 +497,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
             custom_text = form.get("custom_text", None)
             if not custom_text:
                 setting.custom_text = ""
-                current_app.db_session.commit()
+                await g.db_session.commit()
+                await refresh_subscriptions(setting)
 
                 await flash(u"Custom Text > Succesfully removed your custom text.", "success")
                 return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -490,7 +508,8 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                 return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
 
             setting.custom_text = custom_text
-            current_app.db_session.commit()
+            await g.db_session.commit()
+            await refresh_subscriptions(setting)
 
             await flash(u"Custom Text > Succesfully set the custom text.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id) + f"?setting={setting_id}")
@@ -505,8 +524,9 @@ async def guild_notifications_setting_submit(id: int, setting_id: int):
                 print(e)
                 pass
             finally:
-                current_app.db_session.delete(setting)
-                current_app.db_session.commit()
+                await delete_settings(g.db_session, [setting.id])
+                await g.db_session.commit()
+                await current_app.core.ipc.publish("setting_removed", setting_id=setting.id)
 
             await flash(f"Stream Notifications > Deleted the notification setting for {setting.channel_id}.", "success")
             return redirect(url_for("dashboard.guild_notifications", id=id))
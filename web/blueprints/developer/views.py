@@ -13,12 +13,13 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from quart import Blueprint, current_app, flash, render_template, redirect, request, url_for
+from quart import Blueprint, current_app, flash, g, render_template, redirect, request, url_for
 
 from web.helpers.user_handler import developer_only
 
 from utils.validators import is_valid_reddit_username
 
+from utils.database.queries import count_rows, get_dataset, get_dataset_user
 from utils.database.models.testing import BNTestingDataset
 from utils.database.models.custom_prefixes import CustomPrefixes
 from utils.database.models.broadcast_notifications import BNUser, BNSetting
@@ -34,18 +35,18 @@ async def main():
 @developer_bp.route("/stats/")
 @developer_only
 async def stats():
-    guild_count = len(current_app.core.bot.guilds)
+    guild_count = current_app.core.bot.guild_count
     user_count = current_app.core.bot.user_count
-    sn_count = current_app.db_session.query(BNSetting).count()
-    sn_user_count = current_app.db_session.query(BNUser).count()
-    prefix_count = current_app.db_session.query(CustomPrefixes).count()
+    sn_count = await count_rows(g.db_session, BNSetting)
+    sn_user_count = await count_rows(g.db_session, BNUser)
+    prefix_count = await count_rows(g.db_session, CustomPrefixes)
     return await render_template("developer/stats.html", guild_count=guild_count, user_count=user_count, sn_count=sn_count, sn_user_count=sn_user_count, prefix_count=prefix_count)
 
 
 @developer_bp.route("/dataset/")
 @developer_only
 async def dataset():
-    dataset = current_app.db_session.query(BNTestingDataset).all()
+    dataset = await get_dataset(g.db_session)
     return await render_template("developer/dataset.html", dataset=dataset)
 
 
@@ -65,11 +66,12 @@ async def dataset_submit():
         else:
             username = username.lower()
 
-        user = current_app.db_session.query(BNTestingDataset).filter_by(username=username).first()
+        user = await get_dataset_user(g.db_session, username=username)
         if user is None:
             user = BNTestingDataset(username=username)
-            current_app.db_session.add(user)
-            current_app.db_session.commit()
+            g.db_session.add(user)
+            await g.db_session.commit()
+            await current_app.core.ipc.publish("dataset_updated", username=username, added=True)
             await flash(u"Added that user.", "success")
         else:
             await flash(u"That user is already added.", "danger")
@@ -84,13 +86,14 @@ async def dataset_submit():
             await flash(u"That is an invalid user id.", "danger")
             return redirect(url_for("developer.dataset"))
 
-        user = current_app.db_session.query(BNTestingDataset).filter_by(id=int(user_id)).first()
+        user = await get_dataset_user(g.db_session, id=int(user_id))
         if not user:
             await flash(u"There is no user added with that id", "danger")
             return redirect(url_for("developer.dataset"))
 
-        current_app.db_session.delete(user)
-        current_app.db_session.commit()
+        await g.db_session.delete(user)
+        await g.db_session.commit()
+        await current_app.core.ipc.publish("dataset_updated", username=user.username, added=False)
 
         await flash(f"Removed u/{user.username}.", "success")
         return redirect(url_for("developer.dataset"))
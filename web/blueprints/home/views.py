@@ -15,30 +15,37 @@ limitations under the License.
 """
 from quart import Blueprint, current_app, render_template, redirect, session, url_for
 
+from web.helpers.page_cache import cached_page
+
 
 home_bp = Blueprint("home", __name__, url_prefix="/", template_folder="templates")
 
 @home_bp.route("/")
+@cached_page
 async def main():
     return await render_template("home/main.html")
 
 
 @home_bp.route("/features/")
+@cached_page
 async def features():
     return await render_template("home/features.html")
 
 
 @home_bp.route("/commands/")
+@cached_page
 async def commands():
     return await render_template("home/commands.html")
 
 
 @home_bp.route("/privacy/")
+@cached_page
 async def privacy():
     return await render_template("home/privacy.html")
 
 
 @home_bp.route("/credits/")
+@cached_page
 async def credits():
     return await render_template("home/credits.html")
 
@@ -46,7 +53,7 @@ async def credits():
 @home_bp.route("/login/")
 async def login():
     if not current_app.user_handler.get_user().is_real:
-        auth_url, state = current_app.user_handler.base_session(scopes=["identify", "guilds"]).authorization_url("https://discord.com/api/oauth2/authorize")
+        auth_url, state = current_app.user_handler.oauth.authorization_url(scopes=["identify", "guilds"])
         session["DISCORD_STATE"] = state
         return redirect(auth_url)
     else:
@@ -60,5 +67,5 @@ async def callback():
 
 @home_bp.route("/logout/")
 async def logout():
-    current_app.user_handler.deauth_user()
+    await current_app.user_handler.deauth_user()
     return redirect(url_for("home.main"))
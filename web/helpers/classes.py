@@ -15,11 +15,28 @@ limitations under the License.
 """
 from quart import current_app, session
 
-from discord import Permissions
-from discord.utils import get
+from discord import HTTPException, NotFound, Permissions
 
 from functools import cached_property
-from cachetools.func import ttl_cache
+from cachetools import TTLCache
+
+from web.helpers.oauth import OAuthError
+
+
+# (guild id, user id) -> whether the user can manage the guild's settings.
+access_cache = TTLCache(maxsize=4096, ttl=120)
+
+
+def invalidate_access(guild_id: int, user_id: int = None) -> None:
+    """
+    Drop the cached access of a member, or of everyone in a guild (from the bot's member and role events).
+    """
+    if user_id is not None:
+        access_cache.pop((guild_id, user_id), None)
+        return
+
+    for key in [key for key in access_cache.keys() if key[0] == guild_id]:
+        access_cache.pop(key, None)
 
 
 class Guild:
@@ -28,45 +45,81 @@ class Guild:
         self.name = payload["name"]
         self.icon = payload["icon"]
 
+        # The user's permissions in the guild, as given by OAuth when they logged in.
+        self.permissions = Permissions(permissions=int(payload["permissions"]))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "icon": self.icon, "permissions": self.permissions.value}
+
     @cached_property
     def bot_guild(self) -> bool:
-        guild = get(current_app.core.bot.guilds, id=self.id)
-        if guild:
-            return True
-        else:
-            return False
+        return current_app.core.bot.has_guild(self.id)
 
-    @ttl_cache(maxsize=128, ttl=120)
-    def user_has_access(self) -> None:
+    async def user_has_access(self) -> bool:
+        """
+        Checks that the user can manage the guild's settings.
+        The member is taken from the cache if it's there, otherwise it's fetched (and the result cached for a while).
+        If the member can't be fetched, then the permissions given by OAuth are used.
+        """
         user = current_app.user_handler.get_user()
 
-        guild = get(current_app.core.bot.guilds, id=self.id)
-        if guild is None:
+        if not current_app.core.bot.has_guild(self.id):
             return False
 
-        guild_member = guild.get_member(user.id)
-        if guild_member is None:
-            return False
-        else:
-            perms = guild_member.guild_permissions
-            if perms.manage_guild:
-                return True
-            else:
-                return False
+        cache_key = (self.id, user.id)
+        if cache_key in access_cache:
+            return access_cache[cache_key]
+
+        try:
+            guild_member = await current_app.core.bot.find_member(self.id, user.id)
+        except NotFound:
+            guild_member = None
+        except HTTPException:
+            return self.permissions.manage_guild
+
+        has_access = guild_member is not None and guild_member.guild_permissions.manage_guild
+        access_cache[cache_key] = has_access
+        return has_access
 
 
 class User:
-    def __init__(self, user_payload: dict, guilds_payload: dict) -> None:
-        self.id = int(user_payload["id"])
-        self.tag = "{username}#{discrim}".format(username=user_payload["username"], discrim=user_payload["discriminator"])
+    def __init__(self, id: int, tag: str, guilds_payload: list, refreshed_before: bool = False) -> None:
+        self.id = id
+        self.tag = tag
 
         self.is_real = True
         self.is_developer = (self.id in current_app.core.settings.ids.bot_developers)
 
-        self.refreshed_before = False
+        self.refreshed_before = refreshed_before
 
         self.process_guilds(guilds_payload)
 
+    @classmethod
+    def from_payloads(cls, user_payload: dict, guilds_payload: list):
+        """
+        Create a user from the OAuth payloads.
+        """
+        tag = "{username}#{discrim}".format(username=user_payload["username"], discrim=user_payload["discriminator"])
+        return cls(int(user_payload["id"]), tag, guilds_payload)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Create a user from the form that it's kept in the session store as.
+        """
+        return cls(data["id"], data["tag"], data["guilds"], data["refreshed_before"])
+
+    def to_dict(self) -> dict:
+        """
+        Get the compact form that the user is kept in the session store as (with only the guilds that they can manage).
+        """
+        return {
+            "id": self.id,
+            "tag": self.tag,
+            "refreshed_before": self.refreshed_before,
+            "guilds": [guild.to_dict() for guild in self.guilds_mapping.values()],
+        }
+
     def process_guilds(self, guilds_payload: dict) -> None:
         """
         Processes the user's guilds on initiation.
@@ -80,20 +133,23 @@ class User:
 
         self.guilds = sorted(self.guilds_mapping.values(), key=lambda g: g.bot_guild, reverse=True)
 
-    def refresh(self) -> None:
+    async def refresh(self) -> None:
         """
         Refresh a user's guild list, and the user themselves.
         """
         if not self.refreshed_before:
             self.refreshed_before = True
-            discord = current_app.user_handler.base_session(token=session["DISCORD_TOKEN"])
 
-            user_payload = discord.get("https://discord.com/api/users/@me").json()
+            try:
+                user_payload, guilds_payload = await current_app.user_handler.oauth.fetch_user_and_guilds(session["DISCORD_TOKEN"])
+            except OAuthError as e:
+                print(f"WEB: Failed to refresh a user ({e}).")
+                return
+
             loaded_tag = "{username}#{discrim}".format(username=user_payload["username"], discrim=user_payload["discriminator"])
             if loaded_tag != self.tag:
                 self.tag = loaded_tag
 
-            guilds_payload = discord.get("https://discord.com/api/users/@me/guilds").json()
             self.process_guilds(guilds_payload)
 
 
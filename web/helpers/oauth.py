@@ -0,0 +1,137 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp import ClientError, ClientResponseError, ClientSession, ClientTimeout, TCPConnector
+
+from asyncio import TimeoutError, gather
+from secrets import token_urlsafe
+from time import time
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+
+class OAuthError(Exception):
+    pass
+
+
+class DiscordOAuth:
+    api_base = "https://discord.com/api"
+
+    def __init__(self, client_id: str, client_secret: str, redirect_uri: str, token_updater: Callable = None) -> None:
+        """
+        An async Discord OAuth2 client, which makes its requests over one pooled session.
+        :param token_updater: Called with the new token whenever one is refreshed.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token_updater = token_updater
+
+        self.session: Optional[ClientSession] = None
+
+    def get_session(self) -> ClientSession:
+        """
+        Get the shared session (it's created on first use, so that it belongs to the running loop).
+        """
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(
+                connector=TCPConnector(limit=50, keepalive_timeout=60, ttl_dns_cache=300),
+                timeout=ClientTimeout(total=10),
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def authorization_url(self, scopes: list) -> tuple:
+        """
+        Create the URL that users are sent to for authorizing.
+        :return: The URL and the state (which has to be checked on the callback).
+        """
+        state = token_urlsafe(30)
+        params = urlencode({
+            "response_type": "code",
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "scope": " ".join(scopes),
+            "state": state,
+        })
+        return f"{self.api_base}/oauth2/authorize?{params}", state
+
+    async def request_token(self, data: dict) -> dict:
+        data.update(client_id=self.client_id, client_secret=self.client_secret)
+
+        try:
+            async with self.get_session().post(f"{self.api_base}/oauth2/token", data=data) as response:
+                if response.status != 200:
+                    raise OAuthError(f"Token request failed (HTTP {response.status}).")
+                token = await response.json()
+        except (ClientError, TimeoutError) as e:
+            raise OAuthError(f"Token request failed ({e}).")
+
+        token["scope"] = token.get("scope", "").split()
+        token["expires_at"] = time() + token.get("expires_in", 0)
+        return token
+
+    async def fetch_token(self, code: str) -> dict:
+        """
+        Exchange an authorization code for a token.
+        """
+        return await self.request_token({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": self.redirect_uri,
+        })
+
+    async def refresh_token(self, token: dict) -> dict:
+        """
+        Refresh an expired token (passing the new one to the token updater).
+        """
+        token = await self.request_token({
+            "grant_type": "refresh_token",
+            "refresh_token": token["refresh_token"],
+        })
+        if self.token_updater is not None:
+            self.token_updater(token)
+        return token
+
+    async def get(self, token: dict, path: str) -> dict:
+        """
+        Make an authorized GET request to the API.
+        :return: The response's JSON.
+        """
+        async with self.get_session().get(
+            f"{self.api_base}{path}",
+            headers={"Authorization": f"Bearer {token['access_token']}"},
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def fetch_user_and_guilds(self, token: dict) -> tuple:
+        """
+        Fetch a user and their guilds at the same time (refreshing the token first if it has expired).
+        :return: The user payload and the guilds payload.
+        """
+        if token.get("expires_at", 0) <= time() and token.get("refresh_token"):
+            token = await self.refresh_token(token)
+
+        try:
+            return await gather(self.get(token, "/users/@me"), self.get(token, "/users/@me/guilds"))
+        except ClientResponseError as e:
+            raise OAuthError(f"Fetching the user failed (HTTP {e.status}).")
+        except (ClientError, TimeoutError) as e:
+            raise OAuthError(f"Fetching the user failed ({e}).")
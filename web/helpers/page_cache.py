@@ -0,0 +1,116 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from quart import current_app, make_response, request
+
+from cachetools import TTLCache
+
+from email.utils import formatdate, parsedate_to_datetime
+from functools import wraps
+from hashlib import sha1
+from time import time
+
+from utils.build_info import load_build_info
+
+
+def is_not_modified(etag: str, last_modified: float = None) -> bool:
+    """
+    Check the request's conditional headers against a response's validators.
+    If-None-Match is used over If-Modified-Since when both are sent.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        # Weak comparison is used, as the responses are only ever compared for revalidation.
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+class CachedPage:
+    def __init__(self, body: bytes, last_modified: float) -> None:
+        self.body = body
+        self.etag = f'"{sha1(body).hexdigest()}"'
+        self.last_modified = last_modified
+
+
+class PageCache:
+    def __init__(self, app, max_age: int = 300, ttl: int = 3600) -> None:
+        """
+        Keeps the rendered anonymous versions of the public pages, which are the same for everyone until the next deploy.
+        :param max_age: How long (in seconds) browsers and proxies can use a page before revalidating it.
+        :param ttl: How long (in seconds) a rendered page is kept before it's rendered again.
+        """
+        self.max_age = max_age
+        self.pages = TTLCache(maxsize=256, ttl=ttl)
+
+        # The pages only change with a deploy, so they're dated from the build (which is the same across the workers).
+        build_info = load_build_info()
+        self.built_at = build_info.get("built_at", time()) if build_info is not None else time()
+
+        app.page_cache = self
+
+    async def get_page(self, function, *args, **kwargs) -> CachedPage:
+        # The host is part of the key, as the pages have some external URLs.
+        key = (request.host, request.path)
+
+        page = self.pages.get(key)
+        if page is None:
+            body = await function(*args, **kwargs)
+            page = CachedPage(body=body.encode("utf-8"), last_modified=self.built_at)
+            self.pages[key] = page
+        return page
+
+    async def respond(self, function, *args, **kwargs):
+        """
+        Respond with the cached page to anonymous users (or a 304 if they already have it).
+        Logged in users get the page rendered for them, which isn't stored by anything along the way.
+        """
+        if current_app.user_handler.get_user().is_real:
+            response = await make_response(await function(*args, **kwargs))
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        page = await self.get_page(function, *args, **kwargs)
+        if is_not_modified(page.etag, page.last_modified):
+            response = await make_response("", 304)
+        else:
+            response = await make_response(page.body)
+            response.headers["Content-Type"] = "text/html; charset=utf-8"
+
+        response.headers["ETag"] = page.etag
+        response.headers["Last-Modified"] = formatdate(page.last_modified, usegmt=True)
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        response.headers["Vary"] = "Cookie"
+        return response
+
+
+def cached_page(function):
+    """
+    Serve a public page from the page cache to anonymous users.
+    """
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await current_app.page_cache.respond(function, *args, **kwargs)
+
+    return wrapper
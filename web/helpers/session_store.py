@@ -0,0 +1,190 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from aioredis import create_redis_pool
+from cachetools import TTLCache
+
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from json import dumps, loads
+from typing import Optional
+
+from utils.database.models.dashboard_sessions import DashboardSession
+
+
+class SessionStore(ABC):
+    """
+    Keeps the logged in dashboard users (in their compact serialized form) by their id.
+    """
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def set(self, user_id: int, data: dict) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, user_id: int) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStore(SessionStore):
+    def __init__(self, max_len: int, max_age: int) -> None:
+        """
+        An in-memory store, which drops the least recently used users once it's full.
+        """
+        self.users = TTLCache(maxsize=max_len, ttl=max_age)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        return self.users.get(user_id)
+
+    async def set(self, user_id: int, data: dict) -> None:
+        self.users[user_id] = data
+
+    async def delete(self, user_id: int) -> None:
+        self.users.pop(user_id, None)
+
+
+class RedisStore(SessionStore):
+    def __init__(self, url: str, max_age: int, prefix: str = "rpanbot:session:") -> None:
+        """
+        A store in Redis (or anything that's compatible with it), so that it's shared between the web workers.
+        """
+        self.url = url
+        self.max_age = max_age
+        self.prefix = prefix
+
+        self.redis = None
+
+    async def get_redis(self):
+        if self.redis is None:
+            self.redis = await create_redis_pool(self.url)
+        return self.redis
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        redis = await self.get_redis()
+        data = await redis.get(f"{self.prefix}{user_id}")
+        return loads(data) if data is not None else None
+
+    async def set(self, user_id: int, data: dict) -> None:
+        redis = await self.get_redis()
+        await redis.setex(f"{self.prefix}{user_id}", self.max_age, dumps(data, separators=(",", ":")))
+
+    async def delete(self, user_id: int) -> None:
+        redis = await self.get_redis()
+        await redis.delete(f"{self.prefix}{user_id}")
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            self.redis.close()
+            await self.redis.wait_closed()
+            self.redis = None
+
+
+class PostgresStore(SessionStore):
+    def __init__(self, db_handler, max_age: int) -> None:
+        """
+        A store in the bot's database, so that it's shared between the web workers (and survives restarts).
+        """
+        self.db_handler = db_handler
+        self.max_age = timedelta(seconds=max_age)
+
+        # The expired sessions are cleared out every so many saves.
+        self.saves = 0
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        async with self.db_handler.AsyncSession() as db_session:
+            result = await db_session.execute(
+                select(DashboardSession.data)
+                .where(DashboardSession.user_id == user_id, DashboardSession.expires_at > func.now())
+            )
+            data = result.scalar()
+        return loads(data) if data is not None else None
+
+    async def set(self, user_id: int, data: dict) -> None:
+        statement = insert(DashboardSession).values(
+            user_id=user_id,
+            data=dumps(data, separators=(",", ":")),
+            expires_at=func.now() + self.max_age,
+        )
+
+        async with self.db_handler.AsyncSession() as db_session:
+            await db_session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[DashboardSession.user_id],
+                    set_={"data": statement.excluded.data, "expires_at": statement.excluded.expires_at},
+                )
+            )
+
+            self.saves += 1
+            if self.saves % 100 == 0:
+                await db_session.execute(delete(DashboardSession).where(DashboardSession.expires_at <= func.now()))
+
+            await db_session.commit()
+
+    async def delete(self, user_id: int) -> None:
+        async with self.db_handler.AsyncSession() as db_session:
+            await db_session.execute(delete(DashboardSession).where(DashboardSession.user_id == user_id))
+            await db_session.commit()
+
+
+class CachedStore(SessionStore):
+    def __init__(self, backend: SessionStore, max_len: int, max_age: int = 60) -> None:
+        """
+        Puts a small in-memory LRU in front of a shared store, so that most requests don't have to go to it.
+        The cache is kept short lived, as other workers can change the users.
+        """
+        self.backend = backend
+        self.cache = MemoryStore(max_len=max_len, max_age=max_age)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        data = await self.cache.get(user_id)
+        if data is None:
+            data = await self.backend.get(user_id)
+            if data is not None:
+                await self.cache.set(user_id, data)
+        return data
+
+    async def set(self, user_id: int, data: dict) -> None:
+        await self.backend.set(user_id, data)
+        await self.cache.set(user_id, data)
+
+    async def delete(self, user_id: int) -> None:
+        await self.cache.delete(user_id)
+        await self.backend.delete(user_id)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_store(core) -> SessionStore:
+    """
+    Create the session store set up in the config.
+    """
+    settings = core.settings.web.sessions
+    if settings["backend"] == "redis":
+        backend = RedisStore(url=settings["url"] or core.settings.ipc.url, max_age=settings["max_age"])
+    elif settings["backend"] == "postgres":
+        backend = PostgresStore(db_handler=core.db_handler, max_age=settings["max_age"])
+    else:
+        return MemoryStore(max_len=settings["cache_size"], max_age=settings["max_age"])
+    return CachedStore(backend=backend, max_len=settings["cache_size"])
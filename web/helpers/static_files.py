@@ -0,0 +1,126 @@
+"""
+Copyright 2020 RPANBot
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from quart import make_response, request, send_from_directory
+
+from hashlib import sha256
+from mimetypes import guess_type
+from pathlib import Path
+
+from web.helpers.page_cache import is_not_modified
+
+
+# The precompressed variants (made by the build step) that can be served, in order of preference.
+ENCODINGS = [
+    ("br", ".br"),
+    ("gzip", ".gz"),
+]
+
+
+class StaticFile:
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as file:
+            self.version = sha256(file.read()).hexdigest()[:12]
+        self.mimetype = guess_type(path.name)[0]
+
+        # A variant older than its file is left over from before the file was changed, so it isn't served.
+        modified_at = path.stat().st_mtime
+        self.encodings = []
+        for encoding, suffix in ENCODINGS:
+            variant_path = path.with_name(path.name + suffix)
+            if variant_path.is_file() and variant_path.stat().st_mtime >= modified_at:
+                self.encodings.append((encoding, suffix))
+
+
+class StaticFiles:
+    def __init__(self, app, max_age: int = 31536000, unversioned_max_age: int = 3600) -> None:
+        """
+        Serves the static files with long lived caching, using the precompressed variants where the client accepts them.
+        The URLs made by url_for are versioned by the file's hash, so a changed file gets a new URL (and can be cached as immutable).
+        :param max_age: How long (in seconds) versioned files are cached for.
+        :param unversioned_max_age: How long (in seconds) files without (or with an old) version are cached for.
+        """
+        self.folder = Path(app.static_folder)
+        self.max_age = max_age
+        self.unversioned_max_age = unversioned_max_age
+
+        # The files are hashed on startup, as they only change with a deploy.
+        self.files = {}
+        for path in self.folder.rglob("*"):
+            if path.is_file() and path.suffix not in [suffix for _, suffix in ENCODINGS]:
+                self.files[path.relative_to(self.folder).as_posix()] = StaticFile(path)
+
+        app.view_functions["static"] = self.serve
+        app.url_defaults(self.add_version)
+        app.static_files = self
+
+    def add_version(self, endpoint: str, values: dict) -> None:
+        if endpoint == "static" and "v" not in values:
+            static_file = self.files.get(values.get("filename"))
+            if static_file is not None:
+                values["v"] = static_file.version
+
+    def get_accepted_encodings(self) -> set:
+        accepted = set()
+        for coding in request.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.partition(";")
+            params = params.strip()
+
+            # Encodings that are given a quality of 0 are refused.
+            try:
+                quality = float(params[2:]) if params.startswith("q=") else 1.0
+            except ValueError:
+                quality = 1.0
+
+            if quality > 0:
+                accepted.add(name.strip().lower())
+        return accepted
+
+    async def serve(self, filename: str):
+        """
+        The view for the static files.
+        """
+        static_file = self.files.get(filename)
+        if static_file is not None and request.args.get("v") == static_file.version:
+            cache_control = f"public, max-age={self.max_age}, immutable"
+        else:
+            cache_control = f"public, max-age={self.unversioned_max_age}"
+        return await self.send(filename, cache_control)
+
+    async def send(self, filename: str, cache_control: str):
+        """
+        Send a static file (or a 304 if the client already has it).
+        """
+        static_file = self.files.get(filename)
+        if static_file is None:
+            # Files added since startup (or missing ones) are left to Quart.
+            return await send_from_directory(str(self.folder), filename)
+
+        accepted = self.get_accepted_encodings()
+        encoding, suffix = next(((encoding, suffix) for encoding, suffix in static_file.encodings if encoding in accepted), (None, ""))
+
+        etag = f'"{static_file.version}-{encoding}"' if encoding else f'"{static_file.version}"'
+        if is_not_modified(etag):
+            response = await make_response("", 304)
+        else:
+            response = await send_from_directory(str(self.folder), filename + suffix, mimetype=static_file.mimetype, add_etags=False)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+        if static_file.encodings:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
@@ -13,20 +13,22 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from quart import current_app, session, redirect, request, url_for
+from quart import current_app, g, session, redirect, request, url_for
 
 from typing import Union
 from functools import wraps
 
-from expiringdict import ExpiringDict
-from requests_oauthlib import OAuth2Session
-
+from web.helpers.oauth import DiscordOAuth, OAuthError
 from web.helpers.classes import User, UnauthedUser
+from web.helpers.session_store import create_store
 
 
 class UserHandler:
     def __init__(self, app) -> None:
-        self.authed_users = ExpiringDict(max_len=50, max_age_seconds=3600)
+        # The logged in users are kept in the session store, and loaded into g.user for each request.
+        self.store = create_store(app.core)
+        app.before_request(self.load_user)
+        app.after_serving(self.store.close)
 
         app.user_handler = self
         self.unauthed_user = UnauthedUser()
@@ -34,33 +36,43 @@ class UserHandler:
         self.app = app
         self.app.context_processor(self.template_context)
 
+        # Logins and refreshes go through an async client, so they don't hold up the event loop.
+        self.oauth = DiscordOAuth(
+            client_id=self.app.core.settings.discord.client_id,
+            client_secret=self.app.core.settings.discord.client_secret,
+            redirect_uri=self.app.core.settings.web.redirect_uri,
+            token_updater=self.token_update,
+        )
+        self.app.after_serving(self.oauth.close)
+
     async def auth_user(self) -> None:
         """
         Handle authenticating a user on the callback response.
         """
-        if not session.get("DISCORD_STATE"):
-            return redirect(url_for('main.login'))
+        state = session.pop("DISCORD_STATE", None)
+        code = request.args.get("code")
+        if not state or not code or request.args.get("state") != state:
+            return redirect(url_for("home.login"))
 
-        discord = self.base_session(state=session["DISCORD_STATE"])
-        token = discord.fetch_token(
-            "https://discord.com/api/oauth2/token",
-            client_secret=self.app.core.settings.discord.client_secret,
-            authorization_response=request.url
-        )
+        try:
+            token = await self.oauth.fetch_token(code)
 
-        # Ensure that we have the required scopes.
-        if "identify" not in token.get("scope", []) or "guilds" not in token.get("scope", []):
-            return redirect(url_for('main.login'))
+            # Ensure that we have the required scopes.
+            if "identify" not in token["scope"] or "guilds" not in token["scope"]:
+                return redirect(url_for("home.login"))
 
-        # Fetch the info and authenticate the user.
-        user_payload = discord.get("https://discord.com/api/users/@me").json()
-        guilds_payload = discord.get("https://discord.com/api/users/@me/guilds").json()
+            # Fetch the info and authenticate the user.
+            user_payload, guilds_payload = await self.oauth.fetch_user_and_guilds(token)
+        except OAuthError as e:
+            print(f"WEB: Failed to log a user in ({e}).")
+            return redirect(url_for("home.login"))
 
         user_id = int(user_payload["id"])
-        if self.app.core.bot.is_excluded_user(user_id):
+        if self.app.core.exclusions.is_excluded_user(user_id):
             return redirect(url_for("home.main"))
 
-        self.authed_users[user_id] = User(user_payload, guilds_payload)
+        g.user = User.from_payloads(user_payload, guilds_payload)
+        await self.save_user(g.user)
 
         session["DISCORD_ID"] = user_id
         session["DISCORD_TOKEN"] = token
@@ -68,28 +80,43 @@ class UserHandler:
         # Bring the user to the dashboard.
         return redirect(url_for("dashboard.main"))
 
-    def deauth_user(self, user_id: int = None) -> None:
+    async def load_user(self) -> None:
+        """
+        Load the request's user from the session store (before each request).
+        """
+        g.user = self.unauthed_user
+
+        user_id = session.get("DISCORD_ID")
+        if user_id:
+            data = await self.store.get(user_id)
+            if data is not None:
+                g.user = User.from_dict(data)
+            else:
+                # No valid user was found, so deauth the user.
+                await self.deauth_user()
+
+    async def save_user(self, user: User) -> None:
+        """
+        Save a user to the session store (after logging in, or being changed).
+        """
+        await self.store.set(user.id, user.to_dict())
+
+    async def deauth_user(self, user_id: int = None) -> None:
         """
         Deauthenticates a user.
         If an id isn't given, then we are able to delete the session cookies from the user.
         """
         if user_id is None:
-            if session.get("DISCORD_ID") in self.authed_users.keys():
-                del self.authed_users[session["DISCORD_ID"]]
+            if session.get("DISCORD_ID"):
+                await self.store.delete(session["DISCORD_ID"])
             session.pop("DISCORD_ID", None)
             session.pop("DISCORD_TOKEN", None)
+            g.user = self.unauthed_user
         else:
-            self.authed_users.pop(user_id, None)
+            await self.store.delete(user_id)
 
     def get_user(self) -> Union[User, UnauthedUser]:
-        user_id = session.get("DISCORD_ID")
-        if user_id:
-            if user_id in self.authed_users:
-                return self.authed_users[user_id]
-
-            # No valid user was found, so deauth the user.
-            self.deauth_user()
-        return self.unauthed_user
+        return g.get("user", self.unauthed_user)
 
     def get_bot_invite(self) -> str:
         if self.get_user().is_real:
@@ -111,23 +138,6 @@ class UserHandler:
             "support_invite": self.app.core.settings.links.support_guild,
         }
 
-    def base_session(self, token: dict = None, state: str = None, scopes: list = None) -> OAuth2Session:
-        return OAuth2Session(
-            token=token,
-            state=state,
-            scope=scopes,
-
-            client_id=self.app.core.settings.discord.client_id,
-            auto_refresh_kwargs={
-                "client_id": self.app.core.settings.discord.client_id,
-                "client_secret": self.app.core.settings.discord.client_secret,
-            },
-            redirect_uri=self.app.core.settings.web.redirect_uri,
-
-            auto_refresh_url="https://discord.com/api/oauth2/token",
-            token_updater=self.token_update,
-        )
-
     def token_update(self, token: dict) -> None:
         session["DISCORD_TOKEN"] = token
 
@@ -13,11 +13,13 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from quart import Quart, send_from_directory
+from quart import Quart, g
 
-from os import environ
-from os.path import join
+from discord.remote import RemoteBot
 
+from web.helpers.classes import invalidate_access
+from web.helpers.page_cache import PageCache
+from web.helpers.static_files import StaticFiles
 from web.helpers.globals import get_guild_icon, is_category_channel, is_text_channel
 from web.helpers.user_handler import UserHandler
 
@@ -30,23 +32,45 @@ def create_app(core) -> Quart:
     app = Quart(__name__)
     app.core = core
 
-    app.db_session = app.core.db_handler.Session()
+    @app.before_request
+    async def open_db_session() -> None:
+        # Each request gets its own async session, so a slow query only holds up that request.
+        g.db_session = app.core.db_handler.AsyncSession()
+
+    @app.teardown_request
+    async def close_db_session(exc) -> None:
+        db_session = g.pop("db_session", None)
+        if db_session is not None:
+            await db_session.close()
 
     app.config.update(core.settings.web.config)
-    if core.settings.web.config["DEBUG"]:
-        environ["OAUTHLIB_INSECURE_TRANSPORT"] = "true"
-    elif core.settings.web.config["INSECURE_TRANSPORT"]:
-        environ["OAUTHLIB_INSECURE_TRANSPORT"] = "true"
 
     UserHandler(app)
 
+    # The public pages and static files are cached, so that they're cheap to serve.
+    PageCache(app)
+    StaticFiles(app)
+
+    # Keep the dashboard's access cache in line with permission changes seen by the bot.
+    core.ipc.subscribe("access_invalidated", invalidate_access)
+
+    # Without the bot in this process, a REST only client stands in for it.
+    # It's created here (rather than with the app) so that it belongs to the loop that serves the app.
+    if "bot" not in core.roles:
+        @app.before_serving
+        async def start_remote_bot() -> None:
+            core.bot = RemoteBot(core=core)
+            await core.ipc.start()
+            await core.bot.start_remote()
+
+        @app.after_serving
+        async def stop_remote_bot() -> None:
+            await core.bot.close()
+            await core.ipc.close()
+
     @app.route('/favicon.ico')
     async def favicon():
-        return await send_from_directory(
-            join(app.root_path, "static"),
-            "imgs/favicon.ico",
-            mimetype="image/vnd.microsoft.icon"
-        )
+        return await app.static_files.send("imgs/favicon.ico", cache_control="public, max-age=86400")
 
     app.jinja_env.globals["get_guild_icon"] = get_guild_icon
 